@@ -0,0 +1,188 @@
+"""HTTP API serving the dashboard's section tables to other tools.
+
+    python api.py [--host 127.0.0.1] [--port 8502]
+
+serves it with uvicorn; ``streamlit run app.py`` also mounts it under
+``/api`` next to the dashboard.
+
+    GET /sections                       sections, their tables and options
+    GET /sections/{section}             every table of a section, as JSON
+    GET /sections/{section}/{table}     one table, as JSON or Arrow
+
+The tables are the ones ``queries.py`` computes for the dashboard's charts,
+on the store ``backend.current()`` selects. Filters are repeated ``country``,
+``year`` and ``month`` parameters and mean what the sidebar selections mean
+(none selected: no filter); Trends also takes ``metric`` and ``unit``. A
+table is returned as an Arrow IPC stream with ``format=arrow`` or an
+``Accept: application/vnd.apache.arrow.stream`` header, else as JSON
+``{"columns": [...], "data": [[...], ...]}`` with missing values as null.
+
+Queries run on worker threads, so requests are served concurrently.
+Encoded responses go in ``response_cache`` under the canonical filter
+state, so a repeated request is a cache hit and concurrent identical
+requests are computed once; the cache is emptied when the dataset changes.
+It is kept apart from the dashboard's ``figure_cache`` and bounded by the
+bytes of the responses, so API traffic does not evict the sessions' charts.
+Responses carry an ETag and ``If-None-Match`` is answered with 304.
+"""
+
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import backend
+import queries
+from figure_cache import FigureCache, canonical_filters
+from filter_index import FILTER_COLUMNS
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+MAX_RESPONSE_BYTES = 64 * 2**20
+# (body, media type, ETag) per request, shared by every API client
+response_cache = FigureCache(max_entries=4096, max_bytes=MAX_RESPONSE_BYTES, size=lambda answer: len(answer[0]))
+FILTER_PARAMS = dict(zip(("country", "year", "month"), FILTER_COLUMNS))
+# Table names of each section, in the order the section returns them
+TABLES = {
+    "overview": ["totals", "gender", "violation_types", "countries", "attackers"],
+    "trends": ["series"],
+    "violation-patterns": ["types_by_year", "types_by_attacker", "types_by_occupation"],
+    "cross-analysis": ["types_by_country", "attackers_by_occupation", "types_by_gender", "attackers_by_gender"],
+    "governance": ["country_means", "correlation"],
+}
+
+
+def _flat(frame):
+    """``frame`` with string column names and any row labels as its first column."""
+    frame = frame.set_axis([str(c) for c in frame.columns], axis=1)
+    if isinstance(frame.index, pd.RangeIndex):
+        return frame
+    return frame.reset_index()
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _table_json(frame):
+    frame = _flat(frame)
+    cells = frame.astype(object).where(frame.notna(), None)
+    return {"columns": list(frame.columns), "data": cells.to_numpy().tolist()}
+
+
+def _table_arrow(frame):
+    sink = pa.BufferOutputStream()
+    table = pa.Table.from_pandas(_flat(frame), preserve_index=False)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _parse_request(request):
+    """Section, table, filter and options of a request; HTTP errors for bad ones."""
+    section = request.path_params["section"]
+    if section not in queries.SECTIONS:
+        raise HTTPException(404, f"unknown section {section!r}; one of {', '.join(queries.SECTIONS)}")
+    table = request.path_params.get("table")
+    if table is not None and table not in TABLES[section]:
+        raise HTTPException(404, f"unknown table {table!r}; one of {', '.join(TABLES[section])}")
+
+    params = request.query_params
+    selected = {}
+    for param, column in FILTER_PARAMS.items():
+        values = params.getlist(param)
+        if column == "Year":
+            try:
+                values = [int(v) for v in values]
+            except ValueError:
+                raise HTTPException(400, "year must be an integer") from None
+        selected[column] = values
+
+    _, allowed = queries.SECTIONS[section]
+    options = {}
+    for name, choices in allowed.items():
+        options[name] = params.get(name, choices[0])
+        if options[name] not in choices:
+            raise HTTPException(400, f"{name} must be one of {', '.join(choices)}")
+
+    as_arrow = params.get("format") == "arrow" or (
+        "format" not in params and ARROW_MIME in request.headers.get("accept", ""))
+    if as_arrow and table is None:
+        raise HTTPException(400, "Arrow responses hold one table: request /sections/{section}/{table}")
+    return section, table, selected, options, as_arrow
+
+
+def _answer(section, table, selected, options, as_arrow):
+    """Encoded response body, media type and ETag, built once per dataset version."""
+    source = backend.current()
+    index = source.filter_index
+    for column, values in selected.items():
+        unknown = set(values) - set(index.values(column))
+        if unknown:
+            raise HTTPException(400, f"unknown {column} values: {', '.join(map(str, sorted(unknown, key=str)))}")
+    state = canonical_filters(index, *selected.values())
+    where = dict(zip(FILTER_COLUMNS, state))
+
+    def build():
+        tables = queries.run(source, section, where, **options)
+        if as_arrow:
+            body, media_type = _table_arrow(tables[table]), ARROW_MIME
+        else:
+            names = [table] if table else TABLES[section]
+            payload = {
+                "section": section,
+                "version": source.version,
+                "filters": {param: list(state[i]) for i, param in enumerate(FILTER_PARAMS)},
+                "options": options,
+                "tables": {name: _table_json(tables[name]) for name in names},
+            }
+            body = json.dumps(payload, default=_json_value).encode()
+            media_type = "application/json"
+        return body, media_type, '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+
+    key = (section, state, tuple(sorted(options.items())), table, as_arrow)
+    return response_cache.get(source.version, key, build)
+
+
+async def section_tables(request):
+    parsed = _parse_request(request)
+    body, media_type, etag = await run_in_threadpool(_answer, *parsed)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
+
+async def sections(request):
+    return JSONResponse({
+        name: {"tables": TABLES[name], "options": options}
+        for name, (_, options) in queries.SECTIONS.items()
+    })
+
+
+routes = [
+    Route("/sections", sections),
+    Route("/sections/{section}", section_tables),
+    Route("/sections/{section}/{table}", section_tables),
+]
+app = Starlette(routes=routes)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the dashboard's section tables over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,37 @@
+"""Serves the dashboard after warming every section's default view.
+
+    streamlit run app.py
+
+serves ``dashboard.py`` as ``streamlit run dashboard.py`` does, but runs
+``warmup.run`` in the server's startup hook, so the server only accepts
+connections once the unfiltered figures are in the shared cache. The last
+warm-up's stage timings are served as JSON on ``/warmup``, and the section
+tables of ``api.py`` under ``/api``.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import streamlit as st
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+import api
+import warmup
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if warmup.enabled():
+        await asyncio.to_thread(warmup.run)
+    yield
+
+
+async def warmup_report(request):
+    return JSONResponse(warmup.report())
+
+
+app = st.App("dashboard.py", lifespan=lifespan, routes=[
+    Route("/warmup", warmup_report),
+    Mount("/api", app=api.app),
+])
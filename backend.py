@@ -0,0 +1,69 @@
+"""The store the dashboard reads from, shared by the page and the warm-up.
+
+* by default, the snapshot of the CSV held in memory (``data_loader``);
+* with ``SKF_DATASET=<dir>``, the partitioned dataset written by
+  ``dataset_store.py``, answered out of core by ``scan_engine``;
+* with ``SKF_DATASET=<dir> SKF_ENGINE=memory``, the same dataset held in
+  memory and refreshed partition by partition (``live_dataset``).
+
+``current()`` returns handles on the latest version of the selected store.
+"""
+
+import os
+
+from data_loader import dataset_version, derived, load_data, load_dimension
+from filter_index import FilterIndex
+
+
+class Source:
+    """One version of the selected store.
+
+    ``data`` is None for the partitioned stores (the scan engine holds no
+    rows; the in-memory dataset assembles them on demand), and
+    ``dimension`` is None for the scan engine.
+    """
+
+    def __init__(self, dataset_dir=None, engine="scan"):
+        self.engine = self.live = None
+        if dataset_dir and engine == "memory":
+            import live_dataset
+            self.live = live_dataset.open_live(dataset_dir)
+            self.data = None
+            self.dimension = self.live.dimension
+            self.version = self.live.version
+            self.filter_index = self.live.filter_index
+        elif dataset_dir:
+            import scan_engine
+            self.engine = scan_engine.open_engine(dataset_dir)
+            self.data = self.dimension = None
+            self.version = self.engine.version
+            # The scan engine answers filters from partition keys
+            self.filter_index = self.engine
+        else:
+            self.data = load_data()
+            self.dimension = load_dimension()
+            self.version = dataset_version()
+            self.filter_index = derived("filter_index", FilterIndex)
+
+    def cube(self):
+        """Aggregates for the charts; the snapshot's cube is built on first use."""
+        if self.live is not None:
+            return self.live.cube
+        if self.engine:
+            return self.engine
+        from cube import Cube
+        return derived("cube", Cube)
+
+    def governance_stats(self):
+        """``GovernanceStats`` of the Governance section, built once per version."""
+        if self.live is not None:
+            return self.live.governance_stats
+        if self.engine:
+            return self.engine.governance_stats()
+        from governance_stats import GovernanceStats
+        return derived("governance_stats", lambda frame: GovernanceStats.from_dimension(frame, self.dimension))
+
+
+def current():
+    """The selected store, as configured by ``SKF_DATASET`` / ``SKF_ENGINE``."""
+    return Source(os.environ.get("SKF_DATASET"), os.environ.get("SKF_ENGINE", "scan"))
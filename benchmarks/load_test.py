@@ -0,0 +1,452 @@
+"""Multi-user load test of a running dashboard server.
+
+Starts ``streamlit run dashboard.py`` (or any other entry point, e.g.
+``app.py``) and drives concurrent headless sessions over Streamlit's own
+websocket protocol, as browsers do: each session sends widget states,
+waits for the rerun to finish and thinks before its next action. Sessions
+follow a seeded random script of what analysts do:
+
+* switch sections;
+* change the Country / Year / Month multiselects or clear them;
+* click the "Select All" buttons;
+* switch the Trends metric and time unit, sort the Raw Data table;
+* download the filtered rows as CSV (deferred download + HTTP fetch).
+
+Like a browser, a session keeps the element messages the server marks as
+cacheable and reports their hashes with each rerun, so unchanged charts
+arrive as references (``--no-message-cache`` turns this off).
+
+For every concurrency level a fresh server is started (``--servers``
+replicas, sessions spread round-robin over them) and the report gives the
+throughput, p50/p95/p99 latency per action, the bytes received per rerun
+of each section and the RSS and CPU time of every server process, sampled
+from ``/proc`` (Linux).
+
+Usage::
+
+    python -m benchmarks.load_test --sessions 1 4 16 --actions 30 --think 0.5
+    SKF_DISTINCT=hll python -m benchmarks.load_test --app app.py --servers 2
+
+The server inherits the environment, so ``SKF_DATASET`` and the other
+settings apply to it.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+import numpy as np
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+from benchmarks.run import Timings, peak_rss_mb
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASE_PORT = 8650
+# Reruns a cached message survives without being used (global.maxCachedMessageAge)
+MESSAGE_CACHE_AGE = 2
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+NAVIGATION = "📂 Navigate to"
+FILTERS = ["Select Country", "Select Year", "Select Month"]
+SELECT_ALL = ["Select All Countries", "Select All Years", "Select All Months"]
+WIDGETS = {"radio", "selectbox", "multiselect", "number_input", "checkbox", "button"}
+# Action -> (section it is available in or None for any, relative frequency)
+ACTIONS = {
+    "section": (None, 30),
+    "filter": (None, 30),
+    "select_all": (None, 8),
+    "trends": ("Trends", 30),
+    "sort": ("Raw Data", 15),
+    "download": ("Raw Data", 15),
+}
+
+
+class Session:
+    """One browser tab: the widgets of its last rerun and their values."""
+
+    def __init__(self, url, message_cache=True):
+        self.url = url
+        self.ws = None
+        self.session_id = None
+        self.widgets = {}   # label -> (kind, proto) from the last rerun
+        self.values = {}    # widget id -> value sent with the next rerun
+        self.download_id = None
+        self.bytes = 0
+        self.message_cache = {} if message_cache else None  # hash -> [ForwardMsg, last rerun used]
+        self.reruns = 0
+
+    async def connect(self):
+        ws_url = self.url.replace("http", "ws", 1) + "/_stcore/stream"
+        self.ws = await websockets.connect(ws_url, subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        await self.ws.close()
+
+    def value(self, label):
+        kind, proto = self.widgets[label]
+        return self.values[proto.id]
+
+    def options(self, label):
+        return list(self.widgets[label][1].options)
+
+    async def rerun(self, changes=None, click=None):
+        """Rerun with ``changes`` (label -> value) applied and ``click`` pressed.
+
+        Returns the bytes received.
+        """
+        msg = BackMsg()
+        msg.rerun_script.SetInParent()
+        if self.message_cache is not None:
+            msg.rerun_script.cached_message_hashes.extend(self.message_cache)
+        for label, (kind, proto) in self.widgets.items():
+            if kind == "button":
+                if label == click:
+                    state = msg.rerun_script.widget_states.widgets.add(id=proto.id)
+                    state.trigger_value = True
+                continue
+            value = self.values[proto.id] = (changes or {}).get(label, self.values[proto.id])
+            state = msg.rerun_script.widget_states.widgets.add(id=proto.id)
+            if kind == "multiselect":
+                state.string_array_value.data.extend(value)
+            elif kind in ("radio", "selectbox"):
+                state.string_value = value
+            elif kind == "number_input":
+                state.double_value = value
+            elif kind == "checkbox":
+                state.bool_value = value
+        await self.ws.send(msg.SerializeToString())
+
+        widgets = {}
+        self.download_id = None
+        self.reruns += 1
+        received = 0
+        while True:
+            data = await self.ws.recv()
+            received += len(data)
+            fwd = ForwardMsg()
+            fwd.ParseFromString(data)
+            fwd = self._resolve(fwd)
+            kind = fwd.WhichOneof("type")
+            if kind == "script_finished":
+                self._expire()
+                break
+            if kind == "new_session" and fwd.new_session.initialize.session_id:
+                self.session_id = fwd.new_session.initialize.session_id
+            if kind != "delta" or fwd.delta.WhichOneof("type") != "new_element":
+                continue
+            element = fwd.delta.new_element
+            etype = element.WhichOneof("type")
+            if etype == "download_button":
+                self.download_id = element.download_button.deferred_file_id
+            elif etype in WIDGETS:
+                proto = getattr(element, etype)
+                widgets[proto.label] = (etype, proto)
+                if proto.id not in self.values or getattr(proto, "set_value", False):
+                    self.values[proto.id] = _initial_value(etype, proto)
+        self.widgets = widgets
+        self.bytes += received
+        return received
+
+    def _resolve(self, fwd):
+        """``fwd``, or the cached message it refers to; caches cacheable ones."""
+        if self.message_cache is None:
+            return fwd
+        if fwd.ref_hash:
+            entry = self.message_cache[fwd.ref_hash]
+            entry[1] = self.reruns
+            return entry[0]
+        if fwd.metadata.cacheable and fwd.hash:
+            self.message_cache[fwd.hash] = [fwd, self.reruns]
+        return fwd
+
+    def _expire(self):
+        if self.message_cache is not None:
+            for key in [k for k, (_, used) in self.message_cache.items()
+                        if self.reruns - used > MESSAGE_CACHE_AGE]:
+                del self.message_cache[key]
+
+    async def download(self):
+        """Generate the deferred export as the browser does and fetch it."""
+        msg = BackMsg()
+        msg.backend_operation_request.request_id = f"{id(self)}-{time.monotonic_ns()}"
+        msg.backend_operation_request.session_id = self.session_id
+        msg.backend_operation_request.deferred_file.file_id = self.download_id
+        await self.ws.send(msg.SerializeToString())
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(await self.ws.recv())
+            if fwd.WhichOneof("type") == "backend_operation_response":
+                response = fwd.backend_operation_response
+                break
+        if response.error_msg:
+            raise RuntimeError(response.error_msg)
+        body = await asyncio.to_thread(_fetch, self.url + response.deferred_file.url)
+        self.bytes += len(body)
+
+
+def _initial_value(kind, proto):
+    if kind == "multiselect":
+        return list(proto.raw_values) if proto.set_value else [proto.options[i] for i in proto.default]
+    if kind in ("radio", "selectbox"):
+        if proto.set_value:
+            return proto.raw_value
+        return proto.options[proto.default] if 0 <= proto.default < len(proto.options) else ""
+    if kind == "number_input":
+        return proto.value if proto.set_value else proto.default
+    if kind == "checkbox":
+        return proto.value if proto.set_value else proto.default
+    return None
+
+
+def _fetch(url):
+    with urllib.request.urlopen(url) as response:
+        return response.read()
+
+
+def next_action(rng, session):
+    """Pick the next step of a scripted session as ``(name, changes, click)``."""
+    section = session.value(NAVIGATION)
+    available = {name: weight for name, (where, weight) in ACTIONS.items() if where in (None, section)}
+    action = rng.choices(list(available), weights=list(available.values()))[0]
+
+    if action == "filter":
+        label = rng.choice(FILTERS)
+        options = session.options(label)
+        size = 0 if not options or rng.random() < 0.3 else rng.randint(1, min(3, len(options)))
+        return "filter", {label: rng.sample(options, size)}, None
+    if action == "select_all":
+        return "select_all", None, rng.choice(SELECT_ALL)
+    if action == "trends":
+        label = rng.choice(["Select Metric", "Select Time Unit"])
+        other = [o for o in session.options(label) if o != session.value(label)]
+        return "trends", {label: rng.choice(other)}, None
+    if action == "sort":
+        return "sort", {"Sort by": rng.choice(session.options("Sort by"))}, None
+    if action == "download":
+        if session.value("Export format") != "CSV":
+            return "sort", {"Export format": "CSV"}, None
+        return "download", None, None
+    others = [s for s in session.options(NAVIGATION) if s != section]
+    return "section", {NAVIGATION: rng.choice(others)}, None
+
+
+async def run_session(url, n_actions, think, seed, timings, errors, section_bytes, message_cache=True):
+    rng = random.Random(seed)
+    session = Session(url, message_cache)
+    await session.connect()
+    try:
+        start = time.perf_counter()
+        received = await session.rerun()
+        timings.add("open", time.perf_counter() - start)
+        section_bytes[session.value(NAVIGATION)].append(received)
+        for _ in range(n_actions):
+            if think:
+                await asyncio.sleep(rng.expovariate(1 / think))
+            name, changes, click = next_action(rng, session)
+            start = time.perf_counter()
+            try:
+                if name == "download":
+                    await session.download()
+                else:
+                    received = await session.rerun(changes, click)
+                    section_bytes[session.value(NAVIGATION)].append(received)
+            except (RuntimeError, OSError, KeyError) as exc:
+                errors.append(f"{name}: {exc!r}")
+                continue
+            elapsed = time.perf_counter() - start
+            timings.add(name, elapsed)
+            timings.add("all actions", elapsed)
+    finally:
+        await session.close()
+    return session.bytes
+
+
+class ProcessSampler:
+    """RSS and CPU time of a process, sampled from ``/proc``.
+
+    The final PSS splits pages shared between servers (e.g. the mapped
+    dataset of ``SKF_SHARED=1``) evenly among them, unlike RSS.
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.rss_mb = []
+        self.cpu_start = self.cpu_seconds()
+
+    def cpu_seconds(self):
+        try:
+            with open(f"/proc/{self.pid}/stat") as fh:
+                fields = fh.read().rsplit(")", 1)[1].split()
+        except OSError:
+            return float("nan")
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS  # utime + stime
+
+    def sample(self):
+        try:
+            with open(f"/proc/{self.pid}/statm") as fh:
+                self.rss_mb.append(int(fh.read().split()[1]) * PAGE_SIZE / 2**20)
+        except OSError:
+            pass
+
+    def pss_mb(self):
+        try:
+            with open(f"/proc/{self.pid}/smaps_rollup") as fh:
+                for line in fh:
+                    if line.startswith("Pss:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return float("nan")
+
+    def summary(self, wall):
+        cpu = self.cpu_seconds() - self.cpu_start
+        rss = self.rss_mb or [float("nan")]
+        return {
+            "pid": self.pid,
+            "rss_start_mb": rss[0],
+            "rss_mean_mb": sum(rss) / len(rss),
+            "rss_peak_mb": max(rss),
+            "pss_end_mb": self.pss_mb(),
+            "cpu_seconds": cpu,
+            "cpu_percent": 100 * cpu / wall,
+        }
+
+
+def start_server(app, port):
+    cmd = [sys.executable, "-m", "streamlit", "run", app, "--server.headless", "true",
+           "--server.port", str(port), "--browser.gatherUsageStats", "false"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            _fetch(f"http://localhost:{port}/_stcore/health")
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {proc.returncode}")
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not become healthy")
+
+
+def _bytes_summary(section_bytes):
+    """Received KB per rerun of each section."""
+    summary = {}
+    for section, sizes in sorted(section_bytes.items()):
+        kb = np.array(sizes) / 1024
+        summary[section] = {"reruns": len(kb), "kb_mean": kb.mean(), "kb_p50": np.percentile(kb, 50),
+                            "kb_max": kb.max()}
+    return summary
+
+
+async def load_level(urls, samplers, sessions, n_actions, think, seed, message_cache=True):
+    timings = Timings()
+    errors = []
+    section_bytes = defaultdict(list)
+
+    async def sample():
+        while True:
+            for sampler in samplers:
+                sampler.sample()
+            await asyncio.sleep(0.25)
+
+    sampling = asyncio.create_task(sample())
+    start = time.perf_counter()
+    received = await asyncio.gather(*(
+        run_session(urls[i % len(urls)], n_actions, think, seed * 10_000 + i, timings, errors,
+                    section_bytes, message_cache)
+        for i in range(sessions)
+    ))
+    wall = time.perf_counter() - start
+    sampling.cancel()
+    for sampler in samplers:
+        sampler.sample()
+
+    n_done = len(timings.samples["all actions"])
+    return {
+        "sessions": sessions,
+        "servers": len(urls),
+        "actions": n_done,
+        "errors": errors,
+        "wall_seconds": wall,
+        "actions_per_second": n_done / wall,
+        "received_mb": sum(received) / 2**20,
+        "message_cache": message_cache,
+        "section_kb": _bytes_summary(section_bytes),
+        "latency": timings.summary(),
+        "servers_rss_cpu": [s.summary(wall) for s in samplers],
+        "harness_peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_level(app, servers, sessions, n_actions, think, seed, message_cache=True):
+    ports = [BASE_PORT + i for i in range(servers)]
+    procs = [start_server(app, port) for port in ports]
+    try:
+        samplers = [ProcessSampler(p.pid) for p in procs]
+        urls = [f"http://localhost:{port}" for port in ports]
+        return asyncio.run(load_level(urls, samplers, sessions, n_actions, think, seed, message_cache))
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+
+def print_report(res):
+    print(f"\n== {res['sessions']} sessions on {res['servers']} server(s): "
+          f"{res['actions']} actions in {res['wall_seconds']:.1f} s, "
+          f"{res['actions_per_second']:.2f} actions/s, {res['received_mb']:.1f} MB received, "
+          f"{len(res['errors'])} errors")
+    print(f"{'action':14} {'n':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for name, s in sorted(res["latency"].items()):
+        print(f"{name:14} {s['n']:>5} {s['p50']:>10.1f} {s['p95']:>10.1f} {s['p99']:>10.1f} {s['max']:>10.1f}")
+    print(f"{'section':20} {'reruns':>6} {'KB mean':>10} {'KB p50':>10} {'KB max':>10}")
+    for section, b in res["section_kb"].items():
+        print(f"{section:20} {b['reruns']:>6} {b['kb_mean']:>10.1f} {b['kb_p50']:>10.1f} {b['kb_max']:>10.1f}")
+    print(f"{'server pid':14} {'RSS start':>10} {'RSS mean':>10} {'RSS peak':>10} {'PSS end':>10} "
+          f"{'CPU s':>10} {'CPU %':>8}")
+    for s in res["servers_rss_cpu"]:
+        print(f"{s['pid']:<14} {s['rss_start_mb']:>10.0f} {s['rss_mean_mb']:>10.0f} {s['rss_peak_mb']:>10.0f} "
+              f"{s['pss_end_mb']:>10.0f} {s['cpu_seconds']:>10.1f} {s['cpu_percent']:>8.0f}")
+    for error in res["errors"][:5]:
+        print("  error:", error)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the dashboard with concurrent headless sessions.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16],
+                        help="concurrency levels, each run against fresh servers")
+    parser.add_argument("--actions", type=int, default=30, help="actions per session")
+    parser.add_argument("--think", type=float, default=0.5,
+                        help="mean think time between actions in seconds (0: back to back)")
+    parser.add_argument("--servers", type=int, default=1, help="server processes to spread sessions over")
+    parser.add_argument("--app", default="dashboard.py", help="script passed to streamlit run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-message-cache", action="store_true",
+                        help="do not report cached message hashes, so every element is sent in full")
+    parser.add_argument("--json", help="also write the raw results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for sessions in args.sessions:
+        results.append(run_level(args.app, args.servers, sessions, args.actions, args.think, args.seed,
+                                 not args.no_message_cache))
+        print_report(results[-1])
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Headless scaling benchmark of the dashboard's data preparation.
+
+For every dataset size a fresh worker process generates (or reuses) a
+synthetic log, then times the same stages the dashboard runs:
+
+* ``load/*``: parsing the CSV, writing and memory-mapping the snapshot,
+  splitting off the country dimension;
+* ``build/*``: the filter index, the aggregate cube and the Governance
+  statistics;
+* ``filter``: resolving a filter selection to rows;
+* ``<section>/aggregate``: the cube queries of a section, roll-ups and
+  planned batches (``planner.Plan``);
+* ``<section>/figure``: turning aggregates into Plotly figures (for
+  Governance this includes merging its statistics cells);
+* ``<section>/json``: serializing the figures, as sent to the browser;
+* ``raw_data/sort``, ``raw_data/page``: the row-level work of the Raw
+  Data view, which is not answered from the cube.
+
+Query stages cycle through a fixed set of filter selections (none, one
+country, a few years, country + year + month). Shared caches are bypassed
+so every iteration measures a cold computation. Peak RSS is recorded per
+worker, so each size is measured in isolation, along with the in-memory
+size of the loaded frames.
+
+Usage::
+
+    python -m benchmarks.run --rows 10000 100000 1000000 --repeat 20
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+DATA_DIR = os.path.join(tempfile.gettempdir(), "skf_bench")
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Timings:
+    """Wall-clock samples per stage."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.rss = {}
+
+    def add(self, stage, seconds):
+        self.samples[stage].append(seconds)
+        self.rss[stage] = peak_rss_mb()
+
+    def time(self, stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.add(stage, time.perf_counter() - start)
+        return result
+
+    def summary(self):
+        out = {}
+        for stage, samples in self.samples.items():
+            ms = np.asarray(samples) * 1000
+            out[stage] = {
+                "n": len(ms),
+                "p50": float(np.percentile(ms, 50)),
+                "p95": float(np.percentile(ms, 95)),
+                "p99": float(np.percentile(ms, 99)),
+                "max": float(ms.max()),
+                "peak_rss_mb": self.rss.get(stage),
+            }
+        return out
+
+
+class TimedCube:
+    """Cube proxy that books the time of every query as aggregation time.
+
+    ``planner.Plan`` runs on the proxy too, and is booked as a whole: its
+    ``cell_slice`` and the rankings and crosstabs computed from it.
+    """
+
+    def __init__(self, cube):
+        self._cube = cube
+        self._depth = 0
+        self.seconds = 0.0
+
+    def time(self, fn, *args, **kwargs):
+        """Call ``fn``, booking its time unless an enclosing call already is."""
+        start = time.perf_counter()
+        self._depth += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                self.seconds += time.perf_counter() - start
+
+    def __getattr__(self, name):
+        attr = getattr(self._cube, name)
+        if name not in ("rollup", "totals", "top", "cell_slice"):
+            return attr
+        return lambda *args, **kwargs: self.time(attr, *args, **kwargs)
+
+
+def _timed_plan_run(run):
+    def timed(plan, cube, where):
+        if isinstance(cube, TimedCube):
+            return cube.time(run, plan, cube, where)
+        return run(plan, cube, where)
+
+    return timed
+
+
+def filter_scenarios(index):
+    countries = index.values("Country")
+    years = index.values("Year")
+    recent = years[-3:]
+    months = index.available_months(recent[-1:])
+    return [
+        {},
+        {"Country": tuple(countries[:1])},
+        {"Year": tuple(recent)},
+        {"Country": tuple(countries[:1]), "Year": tuple(recent[-1:]), "Month": tuple(months[:2])},
+    ]
+
+
+def figures_of(result):
+    import plotly.graph_objects as go
+
+    items = result if isinstance(result, tuple) else (result,)
+    return [item for item in items if isinstance(item, go.Figure)]
+
+
+def run_sections(timings, data, dimension, index, cube, stats, where, trends_mode):
+    import charts
+    from table_view import page_window, sorted_rows
+
+    rows = timings.time("filter", index.select, **where)
+    builders = {
+        "overview": lambda c: charts.overview_figures(c, where),
+        "trends": lambda c: charts.trends_figure(c, where, *trends_mode),
+        "violation_patterns": lambda c: charts.violation_pattern_figures(c, where),
+        "cross_analysis": lambda c: charts.cross_analysis_figures(c, where),
+    }
+    for section, build in builders.items():
+        timed = TimedCube(cube)
+        start = time.perf_counter()
+        result = build(timed)
+        total = time.perf_counter() - start
+        timings.add(f"{section}/aggregate", timed.seconds)
+        timings.add(f"{section}/figure", total - timed.seconds)
+        timings.time(f"{section}/json", lambda: [f.to_json() for f in figures_of(result)])
+
+    result = timings.time("governance/figure", charts.governance_figures, stats, where)
+    timings.time("governance/json", lambda: [f.to_json() for f in figures_of(result)])
+
+    order = timings.time("raw_data/sort", sorted_rows, data, rows, "Date", False, dimension)
+    timings.time("raw_data/page", page_window, data, order, 1, 100, None, dimension)
+
+
+def worker(n_rows, repeat, seed):
+    import dimensions
+    import ingest
+    import planner
+    import schema
+    from benchmarks.synthetic_data import write_csv
+    from cube import Cube
+    from filter_index import FilterIndex
+    from governance_stats import GovernanceStats
+
+    # Sections plan their crosstabs on the TimedCube they are given
+    planner.Plan.run = _timed_plan_run(planner.Plan.run)
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    csv_path = os.path.join(DATA_DIR, f"synthetic-{n_rows}-{seed}.csv")
+    if not os.path.exists(csv_path):
+        write_csv(csv_path, n_rows, seed=seed)
+    snapshot = os.path.join(DATA_DIR, f"synthetic-{n_rows}-{seed}.feather")
+
+    timings = Timings()
+    frame = timings.time("load/csv", ingest.read_source, csv_path)
+    timings.time("load/snapshot_write", ingest.write_snapshot, frame, csv_path, "benchmark", snapshot)
+    del frame
+    for _ in range(min(repeat, 5)):
+        frame = timings.time("load/snapshot", ingest.read_snapshot, snapshot)
+        data, dimension = timings.time("load/split", dimensions.split, frame)
+    del frame
+
+    index = timings.time("build/filter_index", FilterIndex, data)
+    cube = timings.time("build/cube", Cube, data)
+    stats = timings.time("build/governance_stats", GovernanceStats.from_dimension, data, dimension)
+
+    scenarios = filter_scenarios(index)
+    trends_modes = [(m, g) for m in ("Violations", "Victims") for g in ("Yearly", "Monthly")]
+    for i in range(repeat):
+        run_sections(timings, data, dimension, index, cube, stats, scenarios[i % len(scenarios)],
+                     trends_modes[i % len(trends_modes)])
+
+    return {
+        "rows": n_rows,
+        "cube_cells": len(cube),
+        "csv_bytes": os.path.getsize(csv_path),
+        "snapshot_bytes": os.path.getsize(snapshot),
+        "frame_bytes": schema.memory_footprint(data) + schema.memory_footprint(dimension.table),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": timings.summary(),
+    }
+
+
+def print_report(results):
+    for res in results:
+        print(f"\n== {res['rows']:,} rows  ({res['cube_cells']:,} cube cells, "
+              f"snapshot {res['snapshot_bytes'] / 2**20:,.1f} MB, "
+              f"frames {res['frame_bytes'] / 2**20:,.1f} MB, "
+              f"peak RSS {res['peak_rss_mb']:,.0f} MB)")
+        print(f"{'stage':34} {'n':>4} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10} {'RSS MB':>8}")
+        for stage, s in res["stages"].items():
+            print(f"{stage:34} {s['n']:>4} {s['p50']:>10.1f} {s['p95']:>10.1f} "
+                  f"{s['p99']:>10.1f} {s['max']:>10.1f} {s['peak_rss_mb']:>8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard on synthetic data.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS,
+                        help="dataset sizes, e.g. 10000 1000000 50000000")
+    parser.add_argument("--repeat", type=int, default=20, help="iterations per query stage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the raw results to this file")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        json.dump(worker(args.worker, args.repeat, args.seed), sys.stdout)
+        return
+
+    results = []
+    for n_rows in args.rows:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", "--worker", str(n_rows),
+             "--repeat", str(args.repeat), "--seed", str(args.seed)],
+            check=True, capture_output=True, text=True,
+        )
+        results.append(json.loads(out.stdout))
+        print_report(results[-1:])
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Synthetic SKF violation logs for scaling experiments.
+
+The generator learns a profile from the real ``Cleaned_SKF_data.csv`` and
+samples new rows from it:
+
+* Country from its observed share; Violation_Nature, Attackers,
+  Victim_Occupation and Gender conditionally on the country, so the real
+  cardinalities and their co-occurrence are preserved;
+* report dates and weekdays from their observed distribution per country,
+  optionally spread over a longer history;
+* several victims per violation, following the observed victims-per-ID
+  distribution, with one article URL per violation;
+* coordinates, RSF and World Bank columns copied from the real data per
+  Country x Year, as they are attributes of the country and year; years
+  beyond the real history take those of a random observed year.
+
+Output uses the source CSV schema (string dates), so it exercises the same
+ingest path as the real file.
+
+Usage::
+
+    python -m benchmarks.synthetic_data 1000000 synthetic.csv
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DATA_PATH
+from ingest import DATE_FORMAT
+
+COUNTRY_COLUMNS = [
+    "Country_Latitude", "Country_Longitude", "RSF_Index", "RSF_Score",
+    "WB_VA", "WB_PS", "WB_GovE", "WB_RQ", "WB_RoL", "WB_CoC",
+]
+VICTIM_COLUMNS = ["Violation_Nature", "Attackers", "Victim_Occupation", "Gender"]
+
+
+def _distribution(series):
+    counts = series.value_counts(dropna=False)
+    return counts.index.to_numpy(dtype=object), (counts / counts.sum()).to_numpy()
+
+
+def _years(dates):
+    return pd.to_datetime(pd.Series(dates), format=DATE_FORMAT, errors="coerce").dt.year
+
+
+def fit_profile(path=DATA_PATH):
+    """Empirical distributions of the real dataset."""
+    real = pd.read_csv(path)
+    years = _years(real["Date"])
+    profile = {
+        "columns": list(real.columns),
+        "country": _distribution(real["Country"]),
+        "by_country": {},
+        "victims_per_id": _distribution(real.groupby("Violation_ID").size()),
+        "article_prefix": "https://www.skeyesmedia.org/en/News/News/",
+    }
+    for country, rows in real.groupby("Country"):
+        profile["by_country"][country] = {
+            "dates": _distribution(rows["Date"]),
+            # Year -> attribute values, from the first row of each year
+            "attributes": rows[COUNTRY_COLUMNS].groupby(years[rows.index]).first(),
+            **{col: _distribution(rows[col]) for col in VICTIM_COLUMNS + ["Day"]},
+        }
+    return profile
+
+
+def _sample(rng, distribution, size):
+    values, probs = distribution
+    return values[rng.choice(len(values), size=size, p=probs)]
+
+
+def _spread_dates(rng, dates, extra_years):
+    """Shift sampled dates back by whole years to simulate a longer history."""
+    if not extra_years:
+        return dates
+    parsed = pd.to_datetime(pd.Series(dates), errors="coerce")
+    shifted = pd.to_datetime(pd.DataFrame({
+        "year": parsed.dt.year - rng.integers(0, extra_years + 1, size=len(dates)),
+        "month": parsed.dt.month,
+        "day": parsed.dt.day.clip(upper=28),
+    }), errors="coerce")
+    return shifted.dt.strftime("%Y-%m-%d").to_numpy(dtype=object)
+
+
+def generate(n_rows, seed=0, profile=None, start_id=1, extra_years=0):
+    """Return ``n_rows`` synthetic rows in the source CSV schema."""
+    profile = profile or fit_profile()
+    rng = np.random.default_rng(seed)
+
+    # Violations with one or more victims each, until n_rows victims exist.
+    sizes = []
+    total = 0
+    while total < n_rows:
+        batch = _sample(rng, profile["victims_per_id"], max(1024, n_rows // 2)).astype(np.int64)
+        sizes.append(batch)
+        total += int(batch.sum())
+    sizes = np.concatenate(sizes)
+    sizes = sizes[: np.searchsorted(np.cumsum(sizes), n_rows) + 1]
+    ids = np.repeat(np.arange(start_id, start_id + len(sizes)), sizes)[:n_rows]
+    n_ids = int(ids[-1] - start_id + 1) if n_rows else 0
+
+    # Country, date and weekday belong to the violation; the other attributes
+    # are drawn per victim, conditionally on the country.
+    id_country = _sample(rng, profile["country"], n_ids)
+    id_date = np.empty(n_ids, dtype=object)
+    id_day = np.empty(n_ids, dtype=object)
+    pos = ids - start_id
+    country = id_country[pos]
+    victims = {col: np.empty(n_rows, dtype=object) for col in VICTIM_COLUMNS}
+    for name, spec in profile["by_country"].items():
+        mask = id_country == name
+        k = int(mask.sum())
+        if k:
+            id_date[mask] = _spread_dates(rng, _sample(rng, spec["dates"], k), extra_years)
+            id_day[mask] = _sample(rng, spec["Day"], k)
+        rows = np.flatnonzero(country == name)
+        for col in VICTIM_COLUMNS:
+            victims[col][rows] = _sample(rng, spec[col], len(rows))
+
+    frame = pd.DataFrame({
+        "Day": id_day[pos],
+        "Date": id_date[pos],
+        "Country": country,
+        **victims,
+        "Total_Victims": 1.0,
+        "Article": profile["article_prefix"] + pd.Series(ids).astype(str),
+        "Violation_ID": ids,
+    })
+    frame = frame.join(_attributes(rng, profile, frame["Country"], _years(frame["Date"])))
+    return frame[profile["columns"]]
+
+
+def _attributes(rng, profile, country, year):
+    """Country columns of each row, constant per Country x Year."""
+    out = pd.DataFrame(np.nan, index=country.index, columns=COUNTRY_COLUMNS)
+    for name, spec in profile["by_country"].items():
+        table = spec["attributes"]
+        rows = np.flatnonzero(country.to_numpy() == name)
+        keys = pd.Index(year.iloc[rows].unique())
+        # Years the real data does not cover take a random observed year's values
+        known = keys.isin(table.index)
+        source = keys.where(known, table.index[rng.integers(0, len(table), size=len(keys))])
+        values = table.loc[source].set_axis(keys)
+        out.iloc[rows] = values.loc[year.iloc[rows]].to_numpy(dtype=float)
+    return out
+
+
+def write_csv(path, n_rows, seed=0, chunk_rows=1_000_000, extra_years=0):
+    """Write ``n_rows`` synthetic rows to ``path`` in bounded-memory chunks."""
+    profile = fit_profile()
+    next_id = 1
+    written = 0
+    chunk = 0
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        while written < n_rows:
+            size = min(chunk_rows, n_rows - written)
+            frame = generate(size, seed=seed + chunk, profile=profile,
+                             start_id=next_id, extra_years=extra_years)
+            frame.to_csv(fh, index=False, header=written == 0)
+            next_id = int(frame["Violation_ID"].max()) + 1
+            written += size
+            chunk += 1
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic SKF violation log.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("path")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--extra-years", type=int, default=0,
+                        help="spread reports over this many additional past years")
+    args = parser.parse_args()
+    write_csv(args.path, args.rows, seed=args.seed, extra_years=args.extra_years)
+
+
+if __name__ == "__main__":
+    main()
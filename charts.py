@@ -0,0 +1,571 @@
+"""Figure builders for the dashboard sections.
+
+Each builder draws the tables ``queries.py`` computes for one section (from
+the shared aggregates, or where a chart needs them the filtered rows) as
+Plotly figures. They do not call Streamlit, so their results can be cached
+and shared across sessions.
+
+Plotly's figure modules are imported inside the builders, so they load
+when a section first draws a chart rather than when the dashboard starts.
+"""
+
+import numpy as np
+import pandas as pd
+
+import queries
+from queries import TREND_METRICS, TREND_UNITS  # options of the Trends radios
+from topic_layout import spiral_layout
+
+# Darker blues: the first five of plotly.colors.sequential.Blues, reversed
+blues_palette = ["rgb(8,48,107)", "rgb(8,81,156)", "rgb(33,113,181)", "rgb(66,146,198)", "rgb(107,174,214)"]
+custom_palette = [
+    "#003f5c",  # dark blue
+    "#2f4b7c",  # steel blue
+    "#669bbc",  # soft blue
+    "#d72638",  # vivid red
+    "#f46060",  # softer red
+    "#adb5bd",  # medium grey
+    "#dee2e6",  # light grey
+    "#6c757d",  # dark grey
+]
+
+# Trends series longer than this are downsampled; figures with more points
+# than TREND_WEBGL_POINTS are drawn with WebGL instead of SVG
+TREND_MAX_POINTS = 500
+TREND_WEBGL_POINTS = 1000
+
+
+def overview_figures(cube, where):
+    """Key metrics and the four distribution charts of the Overview."""
+    import plotly.express as px
+
+    tables = queries.overview(cube, where)
+    totals = tables["totals"].to_dict("records")[0]
+    n_countries = totals.pop("countries")
+
+    # Gender pie chart
+    gender_counts = tables["gender"]
+    fig_gender = px.pie(
+        gender_counts,
+        names="Gender",
+        values="Count",
+        title="Gender Distribution of Victims",
+        hole=0.4,
+        color_discrete_sequence=custom_palette
+    )
+    
+    fig_gender.update_traces(
+    textinfo="percent+label",
+    hole=0.4,
+    marker=dict(colors=["#064e66", "#39567b", "#6f97b3"]),
+    domain=dict(x=[0, 0.75])  # keep pie left, occupy 75% of width
+    )
+    
+    fig_gender.update_layout(
+    legend=dict(
+        x=0.65,  # Move horizontally (0 = left, 1 = right)
+        y=0.75,  # Move vertically (0 = bottom, 1 = top)
+        xanchor="left",  # Anchor the legend's x-position
+        yanchor="middle"  # Anchor the legend's y-position
+        )
+    )
+
+    # Top 5 Violation Types
+    top_violations = tables["violation_types"]
+    fig_violations = px.bar(
+        top_violations,
+        x="Count",
+        y="Violation Type",
+        orientation="h",
+        title="Top 5 Violation Types",
+        color_discrete_sequence=["#1f77b4"]  # Replace with your preferred color
+    )
+    fig_violations.update_layout(yaxis=dict(autorange="reversed"), xaxis_title=None, yaxis_title=None)
+
+    # Top Countries as pie
+    top_countries = tables["countries"]
+    fig_countries = px.pie(
+        top_countries,
+        names="Country",
+        values="Count",
+        title="Affected Countries",
+        hole=0.4,
+        color_discrete_sequence=custom_palette  # Use your defined palette
+    )
+
+    fig_countries.update_traces(
+        textinfo="percent+label",
+        hole=0.4,
+        marker=dict(colors=["#064e66", "#39567b", "#6f97b3", "#c0392b", "#7f8c8d"]),
+        domain=dict(x=[0, 0.75])
+    )
+
+    fig_countries.update_layout(
+        legend=dict(
+            x=0.65,
+            y=0.75,
+            xanchor="left",
+            yanchor="middle"
+        )
+    )
+
+
+    # Top 5 Attackers
+    top_attackers = tables["attackers"]
+    fig_attackers = px.bar(
+        top_attackers,
+        x="Count",
+        y="Attacker",
+        orientation="h",
+        title="Top 5 Attacker Groups",
+        color_discrete_sequence=["#1f77b4"]  # or use a consistent shade like in other bar
+    )
+    fig_attackers.update_layout(
+        yaxis=dict(autorange="reversed"),
+        xaxis_title=None,
+        yaxis_title=None
+    )
+
+    return totals, n_countries, fig_gender, fig_violations, fig_countries, fig_attackers
+
+
+def month_keys(year, month_num):
+    """First day of each (year, month) as datetime64, computed on the integers."""
+    months = (np.asarray(year, dtype=np.int64) - 1970) * 12 + np.asarray(month_num, dtype=np.int64) - 1
+    return months.astype("datetime64[M]").astype("datetime64[ns]")
+
+
+def lttb(x, y, n_out):
+    """Points of the series (x, y) that keep its shape, ``n_out`` at most.
+
+    Largest-Triangle-Three-Buckets: the first and last points are kept, the
+    others are split into ``n_out - 2`` buckets and each bucket keeps the
+    point forming the largest triangle with the previously kept point and
+    the mean of the next bucket. Triangles are measured on ``x``, so gaps in
+    a time axis count as such. Kept points are original points, so their
+    values stay exact.
+
+    Returns the positions of the kept points and the first position of the
+    bucket each one stands for.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n), np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt = slice(edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n)
+        mean_x, mean_y = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((x[a] - mean_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep, np.concatenate([[0], edges])
+
+
+def trends_figure(cube, where, chart_choice, time_granularity):
+    """Violations or victims per country over years or months.
+
+    Series longer than ``TREND_MAX_POINTS`` are downsampled with ``lttb`` on
+    the time axis; the hover of a drawn point shows its exact total and the
+    total of the periods it stands for. Figures with more than
+    ``TREND_WEBGL_POINTS`` points are drawn with WebGL traces.
+    """
+    import plotly.graph_objects as go
+
+    chart_title_y = f"Total {chart_choice}"
+
+    # Chronological per-country series
+    grouped = queries.trends(cube, where, chart_choice, time_granularity)["series"]
+    years = grouped["Year"].to_numpy()
+    if time_granularity == "Yearly":
+        x = years
+        t = years
+        x_format = "%{x}"
+        labels = lambda values: values.astype(str)
+    else:
+        x = month_keys(years, grouped["Month_Num"])
+        t = x.astype("datetime64[M]").astype(np.int64)  # months since 1970
+        x_format = "%{x|%b %Y}"
+        labels = lambda values: pd.DatetimeIndex(values).strftime("%b %Y").to_numpy()
+    y = grouped.iloc[:, -1].to_numpy()  # the measure follows the keys
+    countries = grouped["Country"].astype(object).to_numpy()
+
+    traces = []
+    for country in pd.unique(countries):
+        positions = np.flatnonzero(countries == country)
+        keep, starts = lttb(t[positions], y[positions], TREND_MAX_POINTS)
+        shown = positions[keep]
+        hover = f"{country}<br>{x_format}<br>{chart_title_y}: %{{y:,}}"
+        customdata = None
+        if len(shown) < len(positions):
+            # Each drawn point stands for its bucket's periods
+            ends = np.append(starts[1:], len(positions)) - 1
+            first, last = labels(x[positions[starts]]), labels(x[positions[ends]])
+            customdata = np.empty((len(starts), 2), dtype=object)
+            customdata[:, 0] = np.add.reduceat(y[positions], starts)
+            customdata[:, 1] = np.where(first == last, first, first.astype(object) + " to " + last)
+            hover += "<br>%{customdata[1]}: %{customdata[0]:,}"
+        traces.append((country, shown, customdata, hover + "<extra></extra>"))
+    n_points = sum(len(shown) for _, shown, _, _ in traces)
+    downsampled = any(customdata is not None for _, _, customdata, _ in traces)
+
+    trace = go.Scattergl if n_points > TREND_WEBGL_POINTS else go.Scatter
+    fig = go.Figure([
+        trace(
+            x=x[shown], y=y[shown], customdata=customdata, name=str(country), legendgroup=str(country),
+            mode="lines+markers", line_color=custom_palette[i % len(custom_palette)],
+            hovertemplate=hovertemplate,
+        )
+        for i, (country, shown, customdata, hovertemplate) in enumerate(traces)
+    ])
+    title = f"{time_granularity} {chart_title_y} by Country"
+    if downsampled:
+        title += f"<br><sup>{n_points:,} of {len(y):,} points drawn; hover shows the periods each point stands for</sup>"
+    fig.update_layout(title=title, legend_title_text=None, xaxis_title=None, yaxis_title=None)
+
+    return fig
+
+
+def violation_pattern_figures(cube, where):
+    """Top violation types over time, by attacker group and by occupation."""
+    import plotly.express as px
+
+    tables = queries.violation_patterns(cube, where)
+
+    # Top 5 Violation Types per year
+    grouped_violations = tables["types_by_year"]
+
+    # Bar chart: stacked by violation type per year
+    fig_vio_time = px.bar(
+        grouped_violations,
+        x="Year",
+        y="Count",
+        color="Violation_Nature",
+        title="",
+        color_discrete_sequence=["#1f77b4", "#c0392b", "#6f97b3", "#7f8c8d", "#39567b"]
+    )
+
+    fig_vio_time.update_layout(
+        xaxis_title=None,
+        yaxis_title=None
+    )
+
+    # Top 6 violation types by top 6 attacker groups
+    grouped = tables["types_by_attacker"]
+
+    # Sort violation types by total count
+    violation_order = (
+        grouped.groupby("Violation_Nature", observed=True)["Count"].sum()
+        .sort_values(ascending=False)
+        .index.tolist()
+    )
+
+    # Sort attacker groups by total count
+    attacker_order = (
+        grouped.groupby("Attackers", observed=True)["Count"].sum()
+        .sort_values(ascending=False)
+        .index.tolist()
+    )
+
+    # Create stacked bar chart
+    fig_stacked = px.bar(
+        grouped,
+        x="Count",
+        y="Violation_Nature",
+        color="Attackers",
+        title="",
+        orientation="h",
+        category_orders={
+            "Violation_Nature": violation_order,
+            "Attackers": attacker_order
+        },
+        color_discrete_sequence=custom_palette
+    )
+
+    fig_stacked.update_layout(xaxis_title=None, yaxis_title=None)
+
+    # Top 10 violation types by top 10 occupations
+    grouped_vo = tables["types_by_occupation"]
+
+    # Sort violations for consistent order
+    violation_order = (
+        grouped_vo.groupby("Violation_Nature", observed=True)["Count"]
+        .sum()
+        .sort_values(ascending=False)
+        .index.tolist()
+    )
+
+    # Plot horizontal stacked bar chart
+    fig_vo = px.bar(
+        grouped_vo,
+        x="Count",
+        y="Violation_Nature",
+        color="Victim_Occupation",
+        orientation="h",
+        title="",
+        category_orders={"Violation_Nature": violation_order},
+        color_discrete_sequence=custom_palette
+    )
+    fig_vo.update_layout(xaxis_title=None, yaxis_title=None)
+
+    return fig_vio_time, fig_stacked, fig_vo
+
+
+def cross_analysis_figures(cube, where):
+    """Heatmaps crossing violation types, countries, attackers, occupations and gender."""
+    import plotly.express as px
+
+    tables = queries.cross_analysis(cube, where)
+
+    # Top 10 violations by top 10 countries
+    heatmap_vc = tables["types_by_country"]
+
+    # Plot
+    fig_vc = px.imshow(
+        heatmap_vc,
+        labels=dict(x="Country", y="Violation Type", color="Number of Violations"),
+        color_continuous_scale=blues_palette[::-1],
+        title=""
+    )
+    fig_vc.update_layout(xaxis_title=None, yaxis_title=None)
+
+    # Top 10 attacker groups by top 10 occupations
+    heatmap_ao = tables["attackers_by_occupation"]
+
+    # Plot
+    fig_ao = px.imshow(
+        heatmap_ao,
+        labels=dict(x="Victim Occupation", y="Attacker", color="Number of Violations"),
+        color_continuous_scale=blues_palette[::-1],
+        title=""
+    )
+    fig_ao.update_layout(xaxis_title=None, yaxis_title=None)
+
+    # === Left Plot: Violation Type by Gender ===
+    heatmap_data_viol = tables["types_by_gender"]
+
+    fig_viol_gender = px.imshow(
+        heatmap_data_viol,
+        labels=dict(x="Gender", y="Violation Type", color="Number of Violations"),
+        x=heatmap_data_viol.columns,
+        y=heatmap_data_viol.index,
+        color_continuous_scale=blues_palette[::-1]
+    )
+    fig_viol_gender.update_layout(title="Violation Types by Gender", xaxis_title=None, yaxis_title=None)
+
+    # === Right Plot: Attacker by Gender ===
+    heatmap_data_attacker = tables["attackers_by_gender"]
+
+    fig_attacker_gender = px.imshow(
+        heatmap_data_attacker,
+        labels=dict(x="Gender", y="Attacker", color="Number of Violations"),
+        x=heatmap_data_attacker.columns,
+        y=heatmap_data_attacker.index,
+        color_continuous_scale=blues_palette[::-1]
+    )
+    fig_attacker_gender.update_layout(title="Attackers by Gender", xaxis_title=None, yaxis_title=None)
+
+    return fig_vc, fig_ao, fig_viol_gender, fig_attacker_gender
+
+
+def governance_figures(stats, where):
+    """World Bank score grid and RSF/governance correlation matrix.
+
+    ``stats`` is the backend's ``GovernanceStats``, answered for the filter
+    ``where``.
+    """
+    import plotly.express as px
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    # Indicator name mapping
+    indicator_names = {
+        "WB_VA": "Voice and Accountability",
+        "WB_PS": "Political Stability & Absence of Violence",
+        "WB_GovE": "Government Effectiveness",
+        "WB_RQ": "Regulatory Quality",
+        "WB_RoL": "Rule of Law",
+        "WB_CoC": "Control of Corruption"
+    }
+
+    wb_cols = list(indicator_names.keys())
+    tables = queries.governance(stats, where)
+    country_avgs = tables["country_means"]
+
+    # Create 2x3 subplot grid
+    fig_grid = make_subplots(
+        rows=2, cols=3,
+        subplot_titles=[indicator_names[col] for col in wb_cols],
+        horizontal_spacing=0.08, vertical_spacing=0.15
+    )
+
+    # Populate each subplot
+    for i, col in enumerate(wb_cols):
+        r = i // 3 + 1
+        c = i % 3 + 1
+        fig_grid.add_trace(
+            go.Bar(
+                x=country_avgs["Country"],
+                y=country_avgs[col],
+                marker_color='steelblue'
+            ),
+            row=r, col=c
+        )
+        fig_grid.update_yaxes(
+            showgrid=False,
+            title_text=None,
+            showticklabels=True,
+            row=r, col=c
+        )
+        fig_grid.update_xaxes(showgrid=False, row=r, col=c)
+
+    # Final layout tweaks
+    fig_grid.update_layout(
+        showlegend=False,
+        height=600,
+        margin=dict(t=50, b=40),
+    )
+
+    # Rename columns for display
+    renamed_cols = {
+        "RSF_Score": "RSF Freedom Score",
+        "WB_VA": "Voice and Accountability",
+        "WB_PS": "Political Stability & No Violence",
+        "WB_GovE": "Government Effectiveness",
+        "WB_RQ": "Regulatory Quality",
+        "WB_RoL": "Rule of Law",
+        "WB_CoC": "Control of Corruption"
+    }
+
+    corr_matrix = tables["correlation"].rename(columns=renamed_cols, index=renamed_cols)
+
+    # Plot interactive heatmap
+    fig_corr = px.imshow(
+        corr_matrix,
+        text_auto=".2f",
+        aspect="auto",
+        color_continuous_scale=blues_palette[::-1],
+        labels=dict(x="Indicator", y="Indicator", color="Correlation"),
+        title="Correlation Matrix – RSF and Governance Scores"
+    )
+
+    # Improve layout
+    fig_corr.update_layout(
+        xaxis_title=None,
+        yaxis_title=None,
+        xaxis_tickangle=45,
+        margin=dict(t=80, l=20, r=20, b=20)
+    )
+
+    return fig_grid, fig_corr
+
+
+def prepare_topic_words(topic_words_df):
+    """Label, color, size and position the topic words for the lexicon plot."""
+    # Manually remove common Arabic stopwords missed during preprocessing
+    custom_stopwords = {"ها", "نا", "ال", "وا", "عن", "في", "من", "الى", "على", "و", "هو", "هي", "ذلك"}
+    topic_words_df = topic_words_df[~topic_words_df["Word"].isin(custom_stopwords)]
+
+    # Map topic number to label
+    custom_labels = {
+        0: "Airstrikes / Military",
+        1: "Lebanese Legal Affairs",
+        2: "Security / Surveillance",
+        3: "Judicial Proceedings",
+        4: "Home Raids / Arrests",
+        5: "Military / Clashes",
+        6: "Torture / Abuse",
+        7: "Jordan / Political / Media",
+        8: "Threats / Harassment",
+        9: "Detainment Sites / Testimonies"
+    }
+
+    # Assign readable labels and drop unmapped rows
+    topic_words_df["Label"] = topic_words_df["Topic"].map(custom_labels)
+    topic_words_df = topic_words_df.dropna(subset=["Label"])
+
+    # Color palette for labels (including fallback gray)
+    color_map = {
+        "Airstrikes / Military": "#1f77b4",
+        "Lebanese Legal Affairs": "#ff7f0e",
+        "Security / Surveillance": "#2ca02c",
+        "Judicial Proceedings": "#d62728",
+        "Home Raids / Arrests": "#9467bd",
+        "Military / Clashes": "#8c564b",
+        "Torture / Abuse": "#e377c2",
+        "Jordan / Political / Media": "#7f7f7f",
+        "Threats / Harassment": "#bcbd22",
+        "Detainment Sites / Testimonies": "#17becf"
+    }
+
+    # Assign colors based on label
+    topic_words_df["Color"] = topic_words_df["Label"].map(color_map)
+
+    # Normalize font sizes based on Weight
+    max_font = 45
+    min_font = 18
+    topic_words_df["FontSize"] = (
+        ((topic_words_df["Weight"] - topic_words_df["Weight"].min()) /
+         (topic_words_df["Weight"].max() - topic_words_df["Weight"].min())) *
+        (max_font - min_font) + min_font
+    )
+
+    # Collision-free layouts: one for all topics together and one per topic,
+    # so that a single selected topic fills the canvas at full size.
+    topic_words_df = topic_words_df.reset_index(drop=True)
+    words = topic_words_df["Word"].astype(str).to_numpy()
+    sizes = topic_words_df["FontSize"].to_numpy()
+    (topic_words_df["x"], topic_words_df["y"],
+     topic_words_df["Size"]) = spiral_layout(words, sizes)
+    for col in ("x_topic", "y_topic", "Size_topic"):
+        topic_words_df[col] = np.nan
+    for _, rows in topic_words_df.groupby("Label", sort=False).indices.items():
+        x, y, size = spiral_layout(words[rows], sizes[rows])
+        topic_words_df.loc[rows, ["x_topic", "y_topic", "Size_topic"]] = np.column_stack([x, y, size])
+
+    return topic_words_df
+
+
+def topic_words_figure(topic_words_df, selected_label):
+    """Scatter of topic words, optionally restricted to one topic."""
+    import plotly.graph_objects as go
+
+    if selected_label != "All":
+        filtered_df = topic_words_df[topic_words_df["Label"] == selected_label]
+        x_col, y_col, size_col = "x_topic", "y_topic", "Size_topic"
+    else:
+        filtered_df = topic_words_df
+        x_col, y_col, size_col = "x", "y", "Size"
+
+    # Plot words: one text trace per topic with array-valued positions and sizes
+    fig_words = go.Figure()
+    for label, words in filtered_df.groupby("Label", sort=False, observed=True):
+        fig_words.add_trace(
+            go.Scatter(
+                x=words[x_col].to_numpy(),
+                y=words[y_col].to_numpy(),
+                mode="text",
+                text=words["Word"].astype(str).to_numpy(),
+                textfont=dict(size=words[size_col].round(1).to_numpy(), color=words["Color"].iloc[0]),
+                customdata=words["Weight"].round(3).to_numpy(),
+                hovertemplate=f"<b>%{{text}}</b><br>Topic: {label}<br>Weight: %{{customdata}}<extra></extra>",
+                name=label,
+                showlegend=False
+            )
+        )
+
+    fig_words.update_layout(
+        height=600,
+        plot_bgcolor="rgb(40, 40, 40)",
+        paper_bgcolor="rgb(40, 40, 40)",
+        xaxis=dict(visible=False, range=[0, 1]),
+        yaxis=dict(visible=False, range=[0, 1]),
+        margin=dict(l=10, r=10, t=20, b=20),
+    )
+
+    return fig_words
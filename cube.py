@@ -0,0 +1,161 @@
+"""Pre-aggregated cube of the violation log.
+
+Almost every chart in the dashboard is a row count, a sum of
+``Total_Victims`` or a distinct count of ``Violation_ID`` over one or two
+dimensions of the filtered rows. The cube materializes those measures once
+per dataset version at the finest grain the charts need (one cell per
+combination of the dimensions below), so that a chart is answered by
+rolling up cells instead of rescanning raw rows.
+
+Distinct counts are not additive, so each cell also keeps a summary of the
+``Violation_ID`` values it contains, either the exact id set or a
+HyperLogLog sketch (``distinct_counts.py``). Roll-ups merge these per group.
+"""
+
+import abc
+
+import numpy as np
+import pandas as pd
+
+import distinct_counts
+import schema
+from instrumentation import span
+from planner import CellSlice, dimension_codes
+
+CUBE_DIMENSIONS = [
+    "Year", "Month", "Month_Num", "Country", "Violation_Nature",
+    "Attackers", "Victim_Occupation", "Gender",
+]
+MEASURES = ["rows", "victims", "violations"]
+
+
+class Aggregates(abc.ABC):
+    """Queries shared by every backend that implements ``rollup``."""
+
+    approximate = False  # whether "violations" are estimated
+
+    @abc.abstractmethod
+    def rollup(self, by, where=None):
+        """Measures per combination of ``by`` over the rows matching ``where``."""
+
+    def totals(self, where=None):
+        """Overall measures for the filter ``where`` as a dict."""
+        return self.rollup([], where).to_dict("records")[0]
+
+    def cell_slice(self, dims, where=None):
+        """The rows matching ``where`` at the grain of ``dims``, as a
+        ``planner.CellSlice`` taken in one pass; None for backends that only
+        answer roll-ups."""
+        return None
+
+    def top(self, dim, n=None, where=None, measure="rows"):
+        """Largest values of ``dim`` by ``measure``, like ``value_counts().nlargest(n)``."""
+        counts = self.rollup([dim], where).set_index(dim)[measure]
+        counts = counts[counts > 0].sort_values(ascending=False, kind="stable")
+        return counts if n is None else counts.head(n)
+
+
+class Cube(Aggregates):
+    def __init__(self, data, dims=CUBE_DIMENSIONS, distinct=None):
+        self.dims = list(dims)
+        grouped = data.groupby(self.dims, observed=True, dropna=False, sort=True)
+        cells = grouped.agg(
+            rows=("Violation_ID", "size"),
+            victims=("Total_Victims", "sum"),
+        ).reset_index()
+        self.cells = cells
+
+        # Per-cell Violation_ID summaries (exact id sets or sketches) that
+        # roll-ups merge per group; see distinct_counts.py.
+        cell_of_row = grouped.ngroup().to_numpy(dtype=np.int64)
+        id_codes, uniques = pd.factorize(data["Violation_ID"])
+        self.distinct = distinct_counts.MODES[distinct or distinct_counts.default_mode()](
+            cell_of_row, id_codes, uniques, len(cells)
+        )
+        self.approximate = self.distinct.approximate
+
+    @classmethod
+    def concat(cls, cubes):
+        """Cube of the union of disjoint row sets, from the cubes of each set.
+
+        Cells are stacked rather than merged (a key may occur more than once),
+        which roll-ups handle exactly; distinct summaries are combined so
+        distinct counts stay correct across the parts.
+        """
+        cubes = list(cubes)
+        out = cls.__new__(cls)
+        out.dims = cubes[0].dims
+        out.cells = schema.concat_frames([c.cells for c in cubes])
+        out.distinct = type(cubes[0].distinct).concat([c.distinct for c in cubes])
+        out.approximate = out.distinct.approximate
+        return out
+
+    def __len__(self):
+        return len(self.cells)
+
+    def _mask(self, where):
+        mask = None
+        for col, values in (where or {}).items():
+            if len(values) == 0:
+                continue
+            cond = self.cells[col].isin(list(values)).to_numpy()
+            mask = cond if mask is None else mask & cond
+        return mask
+
+    def _dimension_codes(self, dim):
+        # Built once per cube (a concatenated cube builds its own)
+        codes = self.__dict__.setdefault("_codes", {})
+        if dim not in codes:
+            codes[dim] = dimension_codes(self.cells[dim])
+        return codes[dim]
+
+    def cell_slice(self, dims, where=None):
+        """The cells matching ``where``; dimension codes are shared, not copied per query."""
+        with span("aggregate", by="cells", rows_in=len(self.cells)) as record:
+            mask = self._mask(where)
+            cell_idx = np.arange(len(self.cells)) if mask is None else np.flatnonzero(mask)
+            codes = {}
+            for dim in dims:
+                all_codes, values = self._dimension_codes(dim)
+                codes[dim] = (all_codes[cell_idx], values)
+            record["rows_out"] = len(cell_idx)
+        return CellSlice(
+            codes,
+            self.cells["rows"].to_numpy()[cell_idx],
+            self.cells["victims"].to_numpy()[cell_idx],
+            lambda positions, groups, n_groups: self.distinct.count(cell_idx[positions], groups, n_groups),
+        )
+
+    def rollup(self, by, where=None):
+        """Measures grouped by the dimensions ``by`` for the filter ``where``.
+
+        ``where`` maps a dimension to the values to keep; an empty selection
+        leaves that dimension unfiltered. Like ``groupby``, groups with a
+        missing key are dropped. Returns a frame with the ``by`` columns and
+        the ``rows``, ``victims`` and ``violations`` measures.
+        """
+        with span("aggregate", by=",".join(by), rows_in=len(self.cells)) as record:
+            out = self._rollup(list(by), where)
+            record["rows_out"] = len(out)
+            return out
+
+    def _rollup(self, by, where):
+        mask = self._mask(where)
+        cell_idx = np.arange(len(self.cells)) if mask is None else np.flatnonzero(mask)
+        cells = self.cells.iloc[cell_idx]
+
+        if not by:
+            return pd.DataFrame({
+                "rows": [int(cells["rows"].sum())],
+                "victims": [float(cells["victims"].sum())],
+                "violations": [int(self.distinct.count(cell_idx, np.zeros(len(cell_idx), dtype=np.int64), 1)[0])],
+            })
+
+        grouped = cells.groupby(by, observed=True, sort=True)
+        out = grouped[["rows", "victims"]].sum().reset_index()
+        group_codes = grouped.ngroup().to_numpy()
+        keep = ~np.isnan(group_codes) if group_codes.dtype.kind == "f" else slice(None)
+        out["violations"] = self.distinct.count(
+            cell_idx[keep], group_codes[keep].astype(np.int64), len(out)
+        )
+        return out
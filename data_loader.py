@@ -0,0 +1,207 @@
+"""Process-wide loader for the SKF violations dataset.
+
+Streamlit re-executes ``dashboard.py`` on every widget interaction, but
+imported modules stay loaded for the lifetime of the server process. The
+cache kept here is therefore shared by every session and every rerun: each
+source is loaded once per file version and the same frame is handed to all
+callers, who must treat it as read-only.
+
+Frames come from the columnar snapshots written by ``ingest.py``, which are
+memory-mapped rather than parsed. The source CSV is only parsed when its
+snapshot is missing or stale, in which case the snapshot is rebuilt.
+
+Per-country attributes repeated on every row of the violations log are
+split off into a ``dimensions.DimensionTable`` as the frame is loaded (see
+``load_dimension``).
+
+With ``SKF_SHARED=1`` the violations log, its dimension table, filter index
+and cube are instead attached from the generation ``shared_store.py``
+publishes once per version for all server processes on the host.
+
+A file version is identified by its modification time and size, confirmed
+by a SHA-1 of its contents whenever the stat information changes, so a
+``touch`` without a content change does not trigger a reload.
+"""
+
+import os
+import threading
+import time
+
+import dimensions
+import ingest
+import shared_store
+from instrumentation import span
+
+DATA_PATH = ingest.SKF_CSV
+TOPICS_PATH = ingest.TOPICS_CSV
+
+_lock = threading.RLock()
+# path -> {"stat": (mtime_ns, size), "digest": str, "frame": DataFrame,
+#          "dimension": DimensionTable or None,
+#          "shared": shared_store.Generation or None,
+#          "derived": {name: {"lock": Lock, "value": ...}}}
+_cache = {}
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "loads": 0,
+    "snapshot_loads": 0,
+    "csv_loads": 0,
+    "shared_loads": 0,
+    "shared_generation": None,  # generation attached by this process
+    "load_seconds": 0.0,
+    "last_load_seconds": 0.0,
+    "coerced_dates": 0,  # rows of the loaded log whose Date did not parse
+}
+
+
+def _file_stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _digest(path, stat):
+    """Content hash of ``path``, taken from its snapshot when that is fresh."""
+    meta = ingest.snapshot_metadata(ingest.snapshot_path(path))
+    if meta is not None and (stat is None or (meta["source_mtime_ns"], meta["source_size"]) == stat):
+        return meta["source_sha1"]
+    return ingest.file_digest(path)
+
+
+def _read_split(path, stat):
+    frame, digest, origin = _read(path, stat)
+    if "Date" in frame.columns:
+        _stats["coerced_dates"] = frame.attrs.get("coerced_dates", 0)
+    with span("split dimension"):
+        frame, dimension = dimensions.split(frame)
+    return frame, dimension, digest, origin
+
+
+def _read_shared(path, stat):
+    """Attach the shared generation of ``path``, publishing it if needed."""
+    digest = _digest(path, stat)
+    origin = ["shared"]
+
+    def load():
+        # Only called by the process that publishes this version
+        frame, dimension, _, origin[0] = _read_split(path, stat)
+        return frame, dimension
+
+    generation = shared_store.attach(path, digest, load)
+    _stats["shared_generation"] = generation.name
+    _stats["coerced_dates"] = generation.coerced_dates
+    return generation.frame, generation.dimension, digest, origin[0], generation
+
+
+def _read(path, stat):
+    """Load ``path`` from its snapshot when fresh, else from the CSV."""
+    snap = ingest.snapshot_path(path)
+    meta = ingest.snapshot_metadata(snap)
+
+    if stat is None:
+        # Deployed without the CSV: the snapshot is all there is.
+        if meta is None:
+            raise FileNotFoundError(path)
+        return ingest.read_snapshot(snap), meta["source_sha1"], "snapshot"
+
+    if meta is not None and (meta["source_mtime_ns"], meta["source_size"]) == stat:
+        return ingest.read_snapshot(snap), meta["source_sha1"], "snapshot"
+
+    digest = ingest.file_digest(path)
+    if meta is not None and meta["source_sha1"] == digest:
+        return ingest.read_snapshot(snap), digest, "snapshot"
+
+    frame = ingest.read_source(path)
+    try:
+        ingest.write_snapshot(frame, path, digest, snap)
+    except OSError:
+        pass  # read-only deployment; keep serving from the CSV
+    return frame, digest, "csv"
+
+
+def _load(path):
+    with span("load", file=os.path.basename(path)) as record:
+        frame, record["source"] = _load_entry(path)
+        record["rows_out"] = len(frame)
+        return frame
+
+
+def _load_entry(path):
+    stat = _file_stat(path)
+    with _lock:
+        entry = _cache.get(path)
+        if entry is not None and entry["stat"] == stat:
+            _stats["hits"] += 1
+            return entry["frame"], "cache"
+
+        if entry is not None and stat is not None and entry["digest"] == ingest.file_digest(path):
+            # Touched but unchanged: keep the loaded frame.
+            entry["stat"] = stat
+            _stats["hits"] += 1
+            return entry["frame"], "cache"
+
+        _stats["misses"] += 1
+        start = time.perf_counter()
+        shared = None
+        if shared_store.enabled() and path == DATA_PATH:
+            frame, dimension, digest, origin, shared = _read_shared(path, stat)
+        else:
+            frame, dimension, digest, origin = _read_split(path, stat)
+        elapsed = time.perf_counter() - start
+        _stats["loads"] += 1
+        _stats[f"{origin}_loads"] += 1
+        _stats["load_seconds"] += elapsed
+        _stats["last_load_seconds"] = elapsed
+        _cache[path] = {
+            "stat": stat, "digest": digest, "frame": frame, "dimension": dimension,
+            "shared": shared, "derived": {},
+        }
+        return frame, origin
+
+
+def load_data(path=DATA_PATH):
+    """Return the enriched violations dataset (fact columns only)."""
+    return _load(path)
+
+
+def load_dimension(path=DATA_PATH):
+    """Return the per-country attributes split off the violations dataset."""
+    _load_entry(path)
+    return _cache[path]["dimension"]
+
+
+def derived(name, build, path=DATA_PATH):
+    """Memoize ``build(frame)`` for the current version of ``path``.
+
+    Use this for structures derived from the dataset (indexes, aggregates);
+    they are rebuilt automatically when the file changes. Different
+    structures can be built concurrently; callers asking for one that is
+    being built wait for it.
+    """
+    _load_entry(path)
+    with _lock:
+        entry = _cache[path]
+        slot = entry["derived"].setdefault(name, {"lock": threading.Lock()})
+    with slot["lock"]:
+        if "value" not in slot and entry["shared"] is not None and name in entry["shared"].structures:
+            slot["value"] = entry["shared"].structures[name]
+        if "value" not in slot:
+            frame = entry["frame"]
+            with span(f"build {name}", rows_in=len(frame)):
+                slot["value"] = build(frame)
+        return slot["value"]
+
+
+def dataset_version(path=DATA_PATH):
+    """Content hash of the currently cached version of ``path`` (or None)."""
+    entry = _cache.get(path)
+    return entry["digest"] if entry is not None else None
+
+
+def cache_stats():
+    """Snapshot of the hit/miss/load-time counters."""
+    with _lock:
+        return dict(_stats)
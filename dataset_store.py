@@ -0,0 +1,324 @@
+"""Year/Month partitioned Parquet store of the violation log.
+
+Layout::
+
+    <dir>/_manifest.json
+    <dir>/Year=2021/Month_Num=3/part-<generation>-<n>.parquet
+
+The manifest is the source of truth: readers only open the files it lists,
+so a write becomes visible at once when the new manifest replaces the old
+one. For every partition it records the files, row count, countries and
+``Violation_ID`` range, and the generation (write number) that last changed
+it, which lets readers rebuild only what changed.
+
+``build`` converts a whole CSV in bounded chunks. ``append`` ingests a batch
+of new reports: rows get the same date enrichment and typing as the source,
+and each report, identified by ``Violation_ID`` and ``Article``, replaces any
+earlier version of itself. A report has one row per victim, so the key
+identifies a report rather than a row. Only the partitions that receive rows
+or lose superseded ones are rewritten. Files replaced by a write are deleted
+by the next one, so readers still holding the previous manifest can finish.
+There must be one writer at a time.
+
+Usage::
+
+    python dataset_store.py build                      # Cleaned_SKF_data.csv -> snapshots/dataset
+    python dataset_store.py build big.csv /data/skf    # any CSV in the source schema
+    python dataset_store.py append new_reports.csv [/data/skf]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import ingest
+import schema
+
+DATASET_DIR = os.path.join(ingest.SNAPSHOT_DIR, "dataset")
+MANIFEST = "_manifest.json"  # ignored by Arrow dataset discovery ("_" prefix)
+FORMAT = 2
+CHUNK_ROWS = 1_000_000
+ROW_GROUP_ROWS = 128 * 1024
+
+PARTITION_KEY = ["Year", "Month_Num"]
+PARTITIONING = ds.partitioning(
+    pa.schema([("Year", pa.int32()), ("Month_Num", pa.int32())]), flavor="hive"
+)
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"  # rows without a parseable date
+REPORT_KEY = ["Violation_ID", "Article"]
+
+
+# --- Manifest ---
+
+def partition_name(year, month):
+    def value(v):
+        return NULL_PARTITION if v is None else str(v)
+    return f"Year={value(year)}/Month_Num={value(month)}"
+
+
+def partition_order(entry):
+    """Sort key of a manifest entry: calendar order, undated rows last."""
+    return entry["Year"] is None, entry["Year"] or 0, entry["Month_Num"] or 0
+
+
+def read_manifest(directory=DATASET_DIR):
+    with open(os.path.join(directory, MANIFEST)) as fh:
+        manifest = json.load(fh)
+    if manifest.get("format") != FORMAT:
+        raise ValueError(f"{directory}: unsupported dataset format, rebuild it with "
+                         "`python dataset_store.py build`")
+    return manifest
+
+
+def manifest_version(manifest):
+    return hashlib.sha1(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+
+
+def _write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w") as fh:
+        json.dump(manifest, fh, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def partition_files(directory, entry):
+    return [os.path.join(directory, f) for f in entry["files"]]
+
+
+# --- Rows ---
+
+def _arrow_chunk(frame):
+    """Arrow table of a parsed chunk with chunk-independent column types."""
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    fields = []
+    for field in table.schema:
+        kind = field.type
+        if pa.types.is_dictionary(kind) or pa.types.is_null(kind) or pa.types.is_large_string(kind):
+            kind = pa.string()
+        elif field.name in PARTITION_KEY:
+            kind = pa.int32()
+        elif pa.types.is_integer(kind):
+            kind = pa.int64()
+        elif pa.types.is_floating(kind):
+            kind = pa.float64()
+        elif pa.types.is_timestamp(kind):
+            kind = pa.timestamp("us")
+        fields.append(pa.field(field.name, kind))
+    return table.cast(pa.schema(fields))
+
+
+def prepare(frame):
+    """Source rows enriched and typed as stored (partition columns included)."""
+    return _arrow_chunk(schema.apply_schema(ingest.enrich_dates(frame)))
+
+
+def _split(table):
+    """``(year, month, rows)`` per partition; ``rows`` lack the partition columns."""
+    keys = table.select(PARTITION_KEY).to_pandas()
+    groups = keys.groupby(PARTITION_KEY, dropna=False, sort=True).indices
+    rows = table.drop_columns(PARTITION_KEY)
+    for (year, month), positions in groups.items():
+        year = None if pd.isna(year) else int(year)
+        month = None if pd.isna(month) else int(month)
+        yield year, month, rows.take(positions)
+
+
+def _report_keys(table):
+    # Rows missing either key part get a null key and never match.
+    return pc.binary_join_element_wise(
+        pc.cast(table["Violation_ID"], pa.string()), table["Article"], "\x1f"
+    )
+
+
+def _read_partition(directory, entry):
+    return pa.concat_tables(pq.ParquetFile(path).read() for path in partition_files(directory, entry))
+
+
+def _write_partition(directory, name, rows, generation, n=0):
+    """Write one file of partition ``name``; returns its path relative to ``directory``."""
+    relative = f"{name}/part-{generation}-{n}.parquet"
+    path = os.path.join(directory, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pq.write_table(rows.sort_by([("Country", "ascending")]), path + ".tmp", row_group_size=ROW_GROUP_ROWS)
+    os.replace(path + ".tmp", path)
+    return relative
+
+
+def _entry(year, month, generation):
+    return {"Year": year, "Month_Num": month, "files": [], "rows": 0,
+            "countries": [], "id_range": None, "generation": generation}
+
+
+def _add_rows(entry, relative, rows):
+    entry["files"].append(relative)
+    entry["rows"] += rows.num_rows
+    countries = {c for c in pc.unique(rows["Country"]).to_pylist() if c is not None}
+    entry["countries"] = sorted(set(entry["countries"]) | countries)
+    low, high = pc.min_max(rows["Violation_ID"]).values()
+    if low.is_valid:
+        bounds = [low.as_py(), high.as_py()] + (entry["id_range"] or [])
+        entry["id_range"] = [min(bounds), max(bounds)]
+
+
+# --- Writing ---
+
+def build(csv_path=ingest.SKF_CSV, directory=DATASET_DIR, chunk_rows=CHUNK_ROWS):
+    """Convert ``csv_path`` into a partitioned dataset, ``chunk_rows`` at a time.
+
+    The dataset is written next to ``directory`` and swapped in at the end,
+    so readers never see a half-written copy.
+    """
+    tmp = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    columns = None
+    partitions = {}
+    for i, chunk in enumerate(pd.read_csv(csv_path, chunksize=chunk_rows)):
+        table = prepare(chunk)
+        columns = columns or table.column_names
+        for year, month, rows in _split(table):
+            name = partition_name(year, month)
+            entry = partitions.setdefault(name, _entry(year, month, 0))
+            _add_rows(entry, _write_partition(tmp, name, rows, 0, i), rows)
+
+    _write_manifest(tmp, {
+        "format": FORMAT,
+        "source": os.path.basename(csv_path),
+        "source_sha1": ingest.file_digest(csv_path),
+        "columns": columns or [],
+        "generation": 0,
+        "rows": sum(e["rows"] for e in partitions.values()),
+        "partitions": partitions,
+        "obsolete": [],
+        "written": time.time(),
+    })
+
+    old = f"{directory}.old-{os.getpid()}"
+    if os.path.exists(directory):
+        os.replace(directory, old)
+    os.replace(tmp, directory)
+    shutil.rmtree(old, ignore_errors=True)
+    return directory
+
+
+def _holding(directory, partitions, table):
+    """Names of partitions holding an earlier version of a report in ``table``."""
+    ids = pc.unique(table["Violation_ID"]).drop_null()
+    if len(ids) == 0:
+        return set()
+    keys = pc.unique(_report_keys(table)).drop_null()
+    low, high = pc.min_max(ids).values()
+    found = set()
+    for name, entry in partitions.items():
+        bounds = entry["id_range"]
+        if bounds is None or bounds[1] < low.as_py() or bounds[0] > high.as_py():
+            continue
+        for path in partition_files(directory, entry):
+            stored = pq.read_table(path, columns=REPORT_KEY, filters=pc.field("Violation_ID").isin(ids))
+            if pc.any(pc.is_in(_report_keys(stored), value_set=keys)).as_py():
+                found.add(name)
+                break
+    return found
+
+
+def append(source, directory=DATASET_DIR):
+    """Upsert the reports in ``source`` (a CSV path or a frame of source rows).
+
+    Returns a summary of the change: the new generation, rows added and
+    replaced, and the partitions that were rewritten.
+    """
+    manifest = read_manifest(directory)
+    frame = pd.read_csv(source) if isinstance(source, (str, os.PathLike)) else source.copy()
+    table = prepare(frame)
+    keys = pc.unique(_report_keys(table)).drop_null()
+    partitions = manifest["partitions"]
+    generation = manifest["generation"] + 1
+
+    incoming = {partition_name(y, m): (y, m, rows) for y, m, rows in _split(table)}
+    changed = sorted(set(incoming) | _holding(directory, partitions, table))
+    stored_schema = None
+    replaced = 0
+    superseded = []
+    for name in changed:
+        pieces = []
+        if name in partitions:
+            old = _read_partition(directory, partitions[name])
+            stored_schema = old.schema
+            keep = pc.invert(pc.fill_null(pc.is_in(_report_keys(old), value_set=keys), False))
+            pieces.append(old.filter(keep))
+            replaced += old.num_rows - pieces[0].num_rows
+            superseded += partitions[name]["files"]
+        if name in incoming:
+            year, month, rows = incoming[name]
+            if stored_schema is None and partitions:
+                first = next(iter(partitions.values()))
+                stored_schema = pq.read_schema(partition_files(directory, first)[0])
+            pieces.append(rows.select(stored_schema.names).cast(stored_schema) if stored_schema else rows)
+        else:
+            year, month = partitions[name]["Year"], partitions[name]["Month_Num"]
+        merged = pa.concat_tables(pieces)
+        if merged.num_rows == 0:
+            partitions.pop(name, None)
+            continue
+        entry = _entry(year, month, generation)
+        _add_rows(entry, _write_partition(directory, name, merged, generation), merged)
+        partitions[name] = entry
+
+    # Files superseded by the previous write are no longer read by anyone.
+    obsolete, manifest["obsolete"] = manifest["obsolete"], superseded
+    manifest.update(
+        generation=generation,
+        rows=sum(e["rows"] for e in partitions.values()),
+        written=time.time(),
+    )
+    _write_manifest(directory, manifest)
+    for relative in obsolete:
+        try:
+            os.remove(os.path.join(directory, relative))
+        except FileNotFoundError:
+            pass
+    return {
+        "generation": generation,
+        "rows_in": table.num_rows,
+        "reports": len(keys),
+        "rows_replaced": replaced,
+        "partitions": changed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the partitioned dataset.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_cmd = commands.add_parser("build", help="convert a whole CSV")
+    build_cmd.add_argument("csv", nargs="?", default=ingest.SKF_CSV)
+    build_cmd.add_argument("directory", nargs="?", default=DATASET_DIR)
+    build_cmd.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    append_cmd = commands.add_parser("append", help="ingest a CSV of new or corrected reports")
+    append_cmd.add_argument("csv")
+    append_cmd.add_argument("directory", nargs="?", default=DATASET_DIR)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "build":
+        build(args.csv, args.directory, args.chunk_rows)
+        manifest = read_manifest(args.directory)
+        print(f"{args.directory}: {manifest['rows']:,} rows in {len(manifest['partitions'])} partitions "
+              f"({time.perf_counter() - start:.1f}s)")
+    else:
+        change = append(args.csv, args.directory)
+        print(f"{args.directory}: generation {change['generation']}, {change['rows_in']:,} rows "
+              f"({change['reports']:,} reports, {change['rows_replaced']:,} rows replaced) "
+              f"into {len(change['partitions'])} partitions ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Country dimension of the violation log.
+
+Coordinates, RSF and World Bank indicators describe a country in a given
+year, not a violation, yet the source CSV repeats them on every row. The
+loader moves them into a small table with one row per (Country, Year) and
+keeps a compact ``int32`` key per fact row pointing into it.
+
+Charts that only need the indicators (Governance) work on the dimension
+table, weighting each entry by the number of selected fact rows it stands
+for, which reproduces row-level means and correlations exactly. Views that
+show rows (Raw Data, export) join the attributes back for the rows they
+actually emit.
+
+Only columns that really are constant per key are moved; anything else
+stays in the fact table.
+"""
+
+import numpy as np
+import pandas as pd
+
+import schema
+
+DIMENSION_KEY = ["Country", "Year"]
+COUNTRY_ATTRIBUTES = [
+    "Country_Latitude", "Country_Longitude", "RSF_Index", "RSF_Score",
+    "WB_VA", "WB_PS", "WB_GovE", "WB_RQ", "WB_RoL", "WB_CoC",
+]
+
+
+class DimensionTable:
+    def __init__(self, data, key=DIMENSION_KEY, attributes=COUNTRY_ATTRIBUTES):
+        self.key = list(key)
+        self.order = list(data.columns)  # column order of the flat source
+        present = [c for c in attributes if c in data.columns]
+        grouped = data.groupby(self.key, observed=True, dropna=False, sort=True)
+        # Row -> dimension entry; missing keys form their own entry.
+        self.row_keys = grouped.ngroup().to_numpy(dtype=np.int32)
+        table = grouped[present].first()
+        self.columns = [c for c in present if self._constant(data[c], table[c])]
+        self.table = table[self.columns].reset_index()
+
+    @classmethod
+    def concat(cls, tables, order):
+        """Dimension of the union of disjoint fact row sets, in the given order.
+
+        Entries are stacked, so a key may appear once per part; weights and
+        weighted statistics are unaffected. Only attributes every part holds
+        are kept; ``order`` is the source column order.
+        """
+        tables = list(tables)
+        out = cls.__new__(cls)
+        out.key = tables[0].key
+        out.order = list(order)
+        out.columns = [c for c in tables[0].columns if all(c in t.columns for t in tables)]
+        out.table = schema.concat_frames([t.table[t.key + out.columns] for t in tables])
+        offsets = np.cumsum([0] + [len(t) for t in tables[:-1]])
+        out.row_keys = np.concatenate([t.row_keys + o for t, o in zip(tables, offsets)]).astype(np.int32)
+        return out
+
+    def _constant(self, values, per_key):
+        values = values.to_numpy()
+        expected = per_key.to_numpy()[self.row_keys]
+        same = (values == expected) | (pd.isna(values) & pd.isna(expected))
+        return bool(same.all())
+
+    def __len__(self):
+        return len(self.table)
+
+    def keys(self, rows=None):
+        return self.row_keys if rows is None else self.row_keys[rows]
+
+    def weights(self, rows=None):
+        """Number of selected fact rows behind each dimension entry."""
+        return np.bincount(self.keys(rows), minlength=len(self.table))
+
+    def column(self, name, rows=None):
+        """Values of attribute ``name`` for the fact rows ``rows``."""
+        return self.table[name].to_numpy()[self.keys(rows)]
+
+    def join(self, part, rows, columns=None):
+        """``part`` (the fact rows ``rows``) with the attributes put back.
+
+        Columns come out in source order; ``columns`` restricts the output.
+        """
+        wanted = self.order if columns is None else list(columns)
+        out = {}
+        for name in wanted:
+            if name in self.columns:
+                out[name] = self.column(name, rows)
+            elif name in part.columns:
+                out[name] = part[name]
+        return pd.DataFrame(out, index=part.index)
+
+
+def split(data):
+    """``(facts, dimension)``; facts lose the columns the dimension holds."""
+    if not set(DIMENSION_KEY) <= set(data.columns):
+        return data, None
+    dimension = DimensionTable(data)
+    if not dimension.columns:
+        return data, None
+    return data.drop(columns=dimension.columns), dimension
@@ -0,0 +1,156 @@
+"""Lazy, chunked export of the filtered rows.
+
+Nothing is generated until a user actually asks for a download. The export
+is then streamed chunk by chunk from the shared frame into a file on disk,
+so peak memory is bounded by one chunk rather than by the whole CSV string
+plus its encoded copy. Per-country attributes are joined back from the
+country dimension chunk by chunk. Finished artifacts are cached per dataset version,
+filter state and format, and shared by every session; concurrent requests
+for the same artifact wait for a single build.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CHUNK_ROWS = 50_000
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "skf_exports")
+
+FORMATS = {
+    "CSV": {"extension": "csv", "mime": "text/csv"},
+    "Parquet": {"extension": "parquet", "mime": "application/vnd.apache.parquet"},
+}
+
+
+def _empty(data, dimension):
+    """Zero-row frame with the export's columns and dtypes."""
+    if dimension is None:
+        return data.iloc[:0]
+    return dimension.join(data.iloc[:0], np.empty(0, dtype=np.int64))
+
+
+def iter_chunks(data, rows, chunk_rows=CHUNK_ROWS, dimension=None):
+    """Yield the selected rows of ``data`` as frames of at most ``chunk_rows``."""
+    n = len(data) if rows is None else len(rows)
+    for start in range(0, n, chunk_rows):
+        if rows is None:
+            ids = np.arange(start, min(start + chunk_rows, n))
+            chunk = data.iloc[start:start + chunk_rows]
+        else:
+            ids = rows[start:start + chunk_rows]
+            chunk = data.take(ids)
+        yield chunk if dimension is None else dimension.join(chunk, ids)
+
+
+def selection(data, rows, dimension=None, chunk_rows=CHUNK_ROWS):
+    """Export source for rows of the in-memory frame: ``(template, chunks)``.
+
+    ``template`` is a zero-row frame with the output columns and ``chunks``
+    an iterator of frames; other backends provide the same pair.
+    """
+    return _empty(data, dimension), iter_chunks(data, rows, chunk_rows, dimension)
+
+
+def iter_csv(template, chunks):
+    """Yield the CSV encoding of the selection as UTF-8 byte chunks."""
+    yield template.to_csv(index=False).encode("utf-8")
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=False).encode("utf-8")
+
+
+def write_csv(path, template, chunks):
+    with open(path, "wb") as fh:
+        for part in iter_csv(template, chunks):
+            fh.write(part)
+
+
+def write_parquet(path, template, chunks, compression="zstd"):
+    """Write the selection as compressed Parquet, one row group per chunk."""
+    schema = pa.Schema.from_pandas(template, preserve_index=False)
+    with pq.ParquetWriter(path, schema, compression=compression) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+WRITERS = {"CSV": write_csv, "Parquet": write_parquet}
+
+
+class ExportCache:
+    """Size-bounded cache of export artifacts stored as files on disk."""
+
+    def __init__(self, directory=EXPORT_DIR, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._files = OrderedDict()  # key -> (path, size)
+        self._building = {}          # key -> Lock held while the file is written
+        self._lock = threading.Lock()
+
+    def _path(self, key, fmt):
+        # Per-process file names: another worker may evict its own copies.
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        name = f"export-{os.getpid()}-{digest}.{FORMATS[fmt]['extension']}"
+        return os.path.join(self.directory, name)
+
+    def get(self, key, fmt, source):
+        """Path of the artifact for ``key``, writing it on first request.
+
+        ``source()`` returns the ``(template, chunks)`` to write; it is only
+        called when the artifact has to be built.
+        """
+        key = (key, fmt)
+        with self._lock:
+            if key in self._files and os.path.exists(self._files[key][0]):
+                self._files.move_to_end(key)
+                return self._files[key][0]
+            build_lock = self._building.setdefault(key, threading.Lock())
+
+        with build_lock:
+            try:
+                with self._lock:
+                    if key in self._files and os.path.exists(self._files[key][0]):
+                        return self._files[key][0]
+                os.makedirs(self.directory, exist_ok=True)
+                path = self._path(key, fmt)
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                try:
+                    WRITERS[fmt](tmp, *source())
+                    os.replace(tmp, path)
+                except BaseException:
+                    # No partial artifact is left behind; the next request retries.
+                    try:
+                        os.remove(tmp)
+                    except OSError:
+                        pass
+                    raise
+                with self._lock:
+                    self._files[key] = (path, os.path.getsize(path))
+                    self._evict()
+                return path
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+
+    def read(self, key, fmt, source):
+        """The artifact's bytes (e.g. as ``st.download_button`` data)."""
+        with open(self.get(key, fmt, source), "rb") as f:
+            return f.read()
+
+    def _evict(self):
+        total = sum(size for _, size in self._files.values())
+        while total > self.max_bytes and len(self._files) > 1:
+            _, (path, size) = self._files.popitem(last=False)
+            total -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# Shared by every session of this server process.
+export_cache = ExportCache()
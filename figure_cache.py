@@ -0,0 +1,128 @@
+"""Process-wide LRU cache for section figures and aggregates.
+
+Entries are keyed by section plus the canonicalized filter state and any
+section-local widget values, so every session that asks for the same view
+shares one set of figures. The cache is bounded by entry count (and
+optionally by the bytes of its values) and is emptied whenever the dataset
+version changes. A view requested while
+another thread is building it (e.g. the warm-up) waits for that build
+instead of repeating it.
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def _canonical_selection(selected, universe):
+    """Sorted tuple of a selection; selecting everything is the same as none."""
+    selected = tuple(sorted(set(selected), key=str))
+    if universe is not None and set(universe) <= set(selected):
+        return ()
+    return selected
+
+
+def canonical_filters(index, countries=(), years=(), months=()):
+    """Canonical ``(countries, years, months)`` for a sidebar filter state.
+
+    Orderings and "Select All" variants of a selection that keep the same
+    rows map to the same key.
+    """
+    return (
+        _canonical_selection(countries, index.values("Country")),
+        _canonical_selection(years, index.values("Year")),
+        _canonical_selection(months, index.available_months(years)),
+    )
+
+
+class FigureCache:
+    def __init__(self, max_entries=256, max_bytes=None, size=None):
+        """``size(value)`` gives the bytes of a value when ``max_bytes`` is set."""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = size
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._building = {}  # (version, key) -> Future of a build in progress
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+
+    def get(self, version, key, build):
+        """Return the cached value for ``key``, building it on a miss.
+
+        ``version`` identifies the dataset the value was derived from; a new
+        version drops every entry built from the previous one.
+        """
+        building = None
+        with self._lock:
+            if version != self._version:
+                self._clear()
+                self._version = version
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            pending = self._building.get((version, key))
+            if pending is not None:
+                self.waits += 1
+            else:
+                pending = self._building[(version, key)] = Future()
+                self.misses += 1
+                building = pending
+
+        if pending is not building:
+            return pending.result()
+
+        try:
+            value = build()
+        except BaseException as exc:
+            with self._lock:
+                del self._building[(version, key)]
+            pending.set_exception(exc)
+            raise
+
+        with self._lock:
+            del self._building[(version, key)]
+            if version == self._version:
+                self.nbytes -= self._sizes.pop(key, 0)
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                if self.max_bytes is not None:
+                    self._sizes[key] = self.size(value)
+                    self.nbytes += self._sizes[key]
+                while len(self._entries) > self.max_entries or (
+                        self.max_bytes is not None and self.nbytes > self.max_bytes and len(self._entries) > 1):
+                    evicted, _ = self._entries.popitem(last=False)
+                    self.nbytes -= self._sizes.pop(evicted, 0)
+                    self.evictions += 1
+        pending.set_result(value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "evictions": self.evictions,
+                "bytes": self.nbytes,
+            }
+
+    def _clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+        self.nbytes = 0
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+
+# Shared by every session of this server process.
+figure_cache = FigureCache()
@@ -0,0 +1,106 @@
+"""Compact Plotly payloads for the dashboard's charts.
+
+``st.plotly_chart`` sends a figure's whole JSON on every rerun, and most of
+it is not the chart's data: every figure carries the full default template,
+with trace defaults for every Plotly trace type (about 3.7 KB, against a
+few hundred bytes of data for a pie or bar chart). ``payload(fig)`` returns
+a figure that renders the same and serializes smaller:
+
+* the template keeps its layout defaults (colorway, colorscales) and only
+  the trace defaults of the trace types the figure draws;
+* float arrays holding integers or float32-exact values become such typed
+  arrays, and other float arrays are sent as JSON numbers when that is
+  shorter than base64 (short decimals such as rounded means);
+* timestamps at midnight (yearly and monthly axes) are sent as
+  ``YYYY-MM-DD`` dates instead of full ISO timestamps.
+
+The compact figure and its size are computed once per figure object. The
+figures come from the shared figure cache, so that cost is paid once per
+view and dataset version rather than on every rerun.
+
+Charts that did not change are not sent again: Streamlit replaces an
+element message the browser already holds with a reference to its hash.
+It only does so for messages of at least ``global.minCachedMessageSize``
+bytes, which ``.streamlit/config.toml`` lowers from 10 KB so that the
+compact charts qualify. Equal figures give equal payloads, so a chart whose
+data did not change costs a reference instead of its JSON.
+"""
+
+import base64
+import json
+import weakref
+
+import numpy as np
+
+_payloads = {}  # id(figure) -> (compact figure, JSON size), dropped with the figure
+
+
+def _template(template, types):
+    """``template`` with the trace defaults of ``types`` only."""
+    data = template.get("data", {})
+    return {**template, "data": {t: data[t] for t in sorted(types) if t in data}}
+
+
+def _compact_array(values):
+    """The smallest exact encoding of a data array."""
+    if np.issubdtype(values.dtype, np.datetime64):
+        days = values.astype("datetime64[D]")
+        if (values == days).all():
+            return np.datetime_as_string(days, unit="D").tolist()
+        return values
+    if values.dtype.kind != "f":
+        return values
+    finite = np.isfinite(values)
+    if finite.all() and (values == np.round(values)).all() and np.abs(values).max(initial=0) < 2**53:
+        return values.astype(np.int64)  # Plotly picks the smallest integer type
+    as_f4 = values.astype(np.float32)
+    if ((as_f4 == values) | ~finite).all():
+        values = as_f4
+    text = json.dumps(values.tolist())
+    if finite.all() and len(text) < len(base64.b64encode(values.tobytes())):
+        return values.tolist()
+    return values
+
+
+def _compact(obj):
+    if isinstance(obj, np.ndarray):
+        return _compact_array(obj)
+    if isinstance(obj, dict):
+        return {k: _compact(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_compact(v) for v in obj]
+    return obj
+
+
+def compact(fig):
+    """A smaller figure that renders like ``fig``."""
+    import plotly.graph_objects as go
+
+    spec = fig.to_dict()
+    layout = spec.get("layout", {})
+    if "template" in layout:
+        types = {trace.get("type", "scatter") for trace in spec["data"]}
+        layout["template"] = _template(layout["template"], types)
+    spec["data"] = [_compact(trace) for trace in spec["data"]]
+    return go.Figure(spec)
+
+
+def payload(fig):
+    """``(compact figure, JSON bytes)`` of ``fig``, computed once per figure."""
+    key = id(fig)
+    if key not in _payloads:
+        # Figures define __eq__ and are unhashable, so key them by identity.
+        small = compact(fig)
+        _payloads[key] = (small, len(small.to_json().encode("utf-8")))
+        weakref.finalize(fig, _payloads.pop, key, None)
+    return _payloads[key]
+
+
+def prepare(result):
+    """Compute the payloads of the figures in a figure builder's result."""
+    import plotly.graph_objects as go
+
+    for item in result if isinstance(result, tuple) else (result,):
+        if isinstance(item, go.Figure):
+            payload(item)
+    return result
@@ -0,0 +1,181 @@
+"""Bitmap index for the sidebar Country / Year / Month filters.
+
+For every value of every filter column the index keeps a packed bitmap of
+the rows holding that value (one bit per row). A filter state is answered
+by OR-ing the bitmaps of the selected values within a column and AND-ing
+the per-column results, which yields sorted row ids without copying or
+scanning the frame. The Year -> Month availability used by the cascading
+month selector is precomputed as well.
+"""
+
+import numpy as np
+import pandas as pd
+
+import schema
+from instrumentation import span
+
+FILTER_COLUMNS = ("Country", "Year", "Month")
+
+
+def _value_codes(series):
+    """Integer codes and ordered distinct values of a filter column."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        present = np.unique(codes[codes >= 0])
+        values = [series.cat.categories[c] for c in present]
+        remap = np.full(len(series.cat.categories), -1, dtype=np.int64)
+        remap[present] = np.arange(len(present))
+        return np.where(codes >= 0, remap[codes], -1), values
+    codes, uniques = pd.factorize(series, sort=True)
+    return codes, list(uniques)
+
+
+def _as_python(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class FilterIndex:
+    def __init__(self, data, columns=FILTER_COLUMNS):
+        self.n_rows = len(data)
+        self.columns = tuple(columns)
+        self._values = {}    # column -> [value, ...] in display order
+        self._lookup = {}    # column -> {value: position}
+        self._bitmaps = {}   # column -> uint8 array (n_values, ceil(n_rows / 8))
+        self._codes = {}
+
+        for col in self.columns:
+            codes, values = _value_codes(data[col])
+            values = [_as_python(v) for v in values]
+            self._values[col] = values
+            self._lookup[col] = {v: i for i, v in enumerate(values)}
+            self._codes[col] = codes
+            self._bitmaps[col] = self._build_bitmaps(codes, len(values))
+
+        if "Year" in self._codes and "Month" in self._codes:
+            self._months_by_year = self._year_month_pairs()
+        self._codes = None  # only needed while building
+
+    def _build_bitmaps(self, codes, n_values):
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(n_values + 1))
+        bitmaps = np.zeros((n_values, (self.n_rows + 7) // 8), dtype=np.uint8)
+        mask = np.zeros(self.n_rows, dtype=bool)
+        for i in range(n_values):
+            rows = order[bounds[i]:bounds[i + 1]]
+            mask[rows] = True
+            bitmaps[i] = np.packbits(mask)
+            mask[rows] = False
+        return bitmaps
+
+    def _year_month_pairs(self):
+        years, months = self._codes["Year"], self._codes["Month"]
+        width = max(len(self._values["Month"]), 1)
+        valid = (years >= 0) & (months >= 0)
+        pairs = np.unique(years[valid] * width + months[valid])
+        by_year = {}
+        for year_code, month_code in zip(pairs // width, pairs % width):
+            by_year.setdefault(int(year_code), set()).add(int(month_code))
+        return by_year
+
+    def values(self, column):
+        """Distinct non-missing values of ``column`` in display order."""
+        return list(self._values[column])
+
+    def available_months(self, years=None):
+        """Months that occur in the selected years (all years if empty)."""
+        months = self._values["Month"]
+        if not years:
+            return list(months)
+        lookup = self._lookup["Year"]
+        codes = set()
+        for year in years:
+            if year in lookup:
+                codes |= self._months_by_year.get(lookup[year], set())
+        return [m for i, m in enumerate(months) if i in codes]
+
+    def _column_bitmap(self, column, selected):
+        lookup = self._lookup[column]
+        positions = [lookup[v] for v in selected if v in lookup]
+        if not positions:
+            return np.zeros(self._bitmaps[column].shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(self._bitmaps[column][positions], axis=0)
+
+    def bitmap(self, **selections):
+        """Packed row bitmap for a filter state, or None if nothing is filtered.
+
+        Keyword arguments map a filter column to its selected values; an
+        empty or missing selection leaves that column unfiltered.
+        """
+        result = None
+        for column, selected in selections.items():
+            if not selected:
+                continue
+            bits = self._column_bitmap(column, selected)
+            result = bits if result is None else np.bitwise_and(result, bits, out=result)
+        return result
+
+    def select(self, **selections):
+        """Sorted row ids matching a filter state, or None for all rows."""
+        with span("filter", rows_in=self.n_rows) as record:
+            bits = self.bitmap(**selections)
+            if bits is None:
+                record["rows_out"] = self.n_rows
+                return None
+            rows = np.flatnonzero(np.unpackbits(bits, count=self.n_rows))
+            record["rows_out"] = len(rows)
+            return rows
+
+    def count(self, **selections):
+        """Number of rows matching a filter state."""
+        bits = self.bitmap(**selections)
+        if bits is None:
+            return self.n_rows
+        return int(np.unpackbits(bits, count=self.n_rows).sum())
+
+
+class PartitionedIndex:
+    """``FilterIndex`` interface over consecutive row ranges indexed separately.
+
+    Each part (e.g. a Year/Month partition) keeps its own ``FilterIndex``, so
+    only changed parts need rebuilding. Parts holding none of the selected
+    values of some column are skipped without touching their bitmaps.
+    """
+
+    def __init__(self, indexes):
+        self.indexes = list(indexes)
+        self.offsets = np.cumsum([0] + [index.n_rows for index in self.indexes])
+        self.n_rows = int(self.offsets[-1])
+
+    def values(self, column):
+        found = {v for index in self.indexes for v in index.values(column)}
+        if column == "Month":
+            return [m for m in schema.MONTH_ORDER if m in found]
+        return sorted(found)
+
+    def available_months(self, years=None):
+        found = {m for index in self.indexes for m in index.available_months(years)}
+        return [m for m in schema.MONTH_ORDER if m in found]
+
+    def _matching(self, selections):
+        for index, offset in zip(self.indexes, self.offsets):
+            if all(not selected or set(selected) & set(index.values(column))
+                   for column, selected in selections.items()):
+                yield index, offset
+
+    def select(self, **selections):
+        with span("filter", rows_in=self.n_rows, parts=len(self.indexes)) as record:
+            if not any(selections.values()):
+                record["rows_out"] = self.n_rows
+                return None
+            chunks = [np.zeros(0, dtype=np.int64)]
+            for index, offset in self._matching(selections):
+                bits = index.bitmap(**selections)
+                rows = (np.arange(index.n_rows) if bits is None
+                        else np.flatnonzero(np.unpackbits(bits, count=index.n_rows)))
+                chunks.append(rows + offset)
+            rows = np.concatenate(chunks)
+            record["rows_out"] = len(rows)
+            return rows
+
+    def count(self, **selections):
+        return sum(index.count(**selections) for index, _ in self._matching(selections))
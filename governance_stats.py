@@ -0,0 +1,191 @@
+"""Mergeable statistics behind the Governance section.
+
+The Governance charts are per-country means of the World Bank scores and
+the correlation matrix of the RSF and World Bank scores, over the rows
+selected by the sidebar filters. Both are functions of a few sufficient
+statistics, which ``GovernanceStats`` keeps per Country x Year x Month cell
+(the sidebar filters select whole cells):
+
+* ``rows``: rows in the cell;
+* ``counts`` and ``sums``: per score, the rows where it is present and the
+  sum of its values there (the means skip missing scores, like ``mean()``);
+* ``complete``, ``means`` and ``comoments``: the rows with every score
+  present (as ``dropna()`` keeps them for the correlation), their mean
+  vector and their centered sums of cross-products.
+
+A filter state is answered by merging the selected cells: sums add up and
+co-moments combine with the cells' deviations from the merged mean (Chan
+et al.), which is the weighted correlation of the cells without the
+cancellation of raw sums of squares. Merging never touches rows, so the
+cost depends on the number of cells only.
+
+Statistics of disjoint row sets combine with ``concat``: the in-memory
+partitioned dataset builds them per partition and the scan engine per
+partition generation, so appended partitions update them incrementally,
+and ``add`` folds new rows into existing statistics.
+"""
+
+import numpy as np
+import pandas as pd
+
+import schema
+
+STAT_KEY = ["Country", "Year", "Month"]
+WB_COLUMNS = ["WB_VA", "WB_PS", "WB_GovE", "WB_RQ", "WB_RoL", "WB_CoC"]
+CORR_COLUMNS = ["RSF_Score"] + WB_COLUMNS
+
+
+def _combine(complete, means, comoments, groups, n_groups):
+    """Merged (complete, means, comoments) per group of cells."""
+    total = np.bincount(groups, weights=complete, minlength=n_groups)
+    # Shifted by one member's mean, so that cells with equal means merge
+    # exactly (a constant score keeps zero variance, hence NaN correlations)
+    members = np.flatnonzero(complete > 0)
+    first_groups, first = np.unique(groups[members], return_index=True)
+    shift = np.zeros((n_groups, means.shape[1]))
+    shift[first_groups] = means[members[first]]
+    offset = np.where(complete[:, None] > 0, means - shift[groups], 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        merged = shift + np.stack([
+            np.bincount(groups, weights=complete * offset[:, j], minlength=n_groups)
+            for j in range(means.shape[1])
+        ], axis=1) / np.where(total > 0, total, 1)[:, None]
+    # Empty groups keep zero means, so they never turn a later merge into NaN
+    deviation = np.where(complete[:, None] > 0, means - merged[groups], 0)
+    spread = np.einsum("c,ci,cj->cij", complete, deviation, deviation)
+    merged_comoments = np.zeros((n_groups,) + comoments.shape[1:])
+    np.add.at(merged_comoments, groups, comoments + spread)
+    return total, merged, merged_comoments
+
+
+class GovernanceStats:
+    def __init__(self, keys, values, weights=None):
+        """Statistics of observations ``values`` (one row per observation).
+
+        ``keys`` holds the ``STAT_KEY`` columns of each observation and
+        ``weights`` the number of rows it stands for (default 1), so a table
+        of distinct rows with their multiplicity gives the statistics of the
+        rows themselves.
+        """
+        values = np.asarray(values, dtype=float)
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=float)
+        grouped = keys.groupby(STAT_KEY, observed=True, dropna=False, sort=True)
+        cells = grouped.ngroup().to_numpy(dtype=np.int64)
+        n_cells = grouped.ngroups
+        self.keys = grouped.size().reset_index()[STAT_KEY]
+
+        present = ~np.isnan(values)
+        self.rows = np.bincount(cells, weights=weights, minlength=n_cells)
+        self.counts = np.stack([
+            np.bincount(cells, weights=weights * present[:, j], minlength=n_cells)
+            for j in range(values.shape[1])
+        ], axis=1)
+        self.sums = np.stack([
+            np.bincount(cells, weights=weights * np.where(present[:, j], values[:, j], 0), minlength=n_cells)
+            for j in range(values.shape[1])
+        ], axis=1)
+
+        # Every observation is a cell of its own, merged into the key cells
+        complete = present.all(axis=1)
+        keep = np.flatnonzero(complete)
+        self.complete, self.means, self.comoments = _combine(
+            weights[keep], values[keep], np.zeros((len(keep),) + (values.shape[1],) * 2),
+            cells[keep], n_cells,
+        )
+
+    @classmethod
+    def from_rows(cls, data, columns=CORR_COLUMNS):
+        """Statistics of the rows of ``data`` (key and score columns)."""
+        return cls(data[STAT_KEY], data[list(columns)].to_numpy(dtype=float))
+
+    @classmethod
+    def from_dimension(cls, facts, dimension, columns=CORR_COLUMNS):
+        """Statistics of fact rows whose scores live in a ``DimensionTable``.
+
+        The scores are constant per dimension entry (Country x Year), so the
+        rows are counted per entry and month and each count stands for that
+        many identical rows.
+        """
+        months = facts["Month"].cat.codes.to_numpy().astype(np.int64)
+        n_months = len(facts["Month"].cat.categories) + 1
+        # Missing months (code -1) get a slot of their own
+        pairs, counts = np.unique(dimension.row_keys.astype(np.int64) * n_months + months + 1,
+                                  return_counts=True)
+        entries, month_codes = pairs // n_months, pairs % n_months - 1
+        table = dimension.table.iloc[entries].reset_index(drop=True)
+        keys = table[["Country", "Year"]].assign(
+            Month=pd.Categorical.from_codes(month_codes, dtype=facts["Month"].dtype))
+        return cls(keys, table[list(columns)].to_numpy(dtype=float), counts)
+
+    @classmethod
+    def from_cells(cls, keys, rows, counts, sums, complete, means, comoments):
+        out = cls.__new__(cls)
+        out.keys = keys.reset_index(drop=True)
+        out.rows, out.counts, out.sums = rows, counts, sums
+        out.complete, out.means, out.comoments = complete, means, comoments
+        return out
+
+    @classmethod
+    def concat(cls, parts):
+        """Statistics of the union of disjoint row sets.
+
+        Cells are stacked rather than merged (a key may occur once per
+        part), which every query handles; ``compact`` merges them.
+        """
+        parts = list(parts)
+        return cls.from_cells(
+            schema.concat_frames([p.keys for p in parts]),
+            *(np.concatenate([getattr(p, name) for p in parts])
+              for name in ("rows", "counts", "sums", "complete", "means", "comoments")),
+        )
+
+    def compact(self):
+        """The same statistics with one cell per key."""
+        grouped = self.keys.groupby(STAT_KEY, observed=True, dropna=False, sort=True)
+        groups = grouped.ngroup().to_numpy(dtype=np.int64)
+        n = grouped.ngroups
+        if n == len(self.keys):
+            return self
+        add = lambda a: np.stack([np.bincount(groups, weights=a[:, j], minlength=n) for j in range(a.shape[1])], axis=1)
+        return GovernanceStats.from_cells(
+            grouped.size().reset_index()[STAT_KEY],
+            np.bincount(groups, weights=self.rows, minlength=n), add(self.counts), add(self.sums),
+            *_combine(self.complete, self.means, self.comoments, groups, n),
+        )
+
+    def add(self, data, columns=CORR_COLUMNS):
+        """These statistics with the rows of ``data`` folded in."""
+        return GovernanceStats.concat([self, GovernanceStats.from_rows(data, columns)]).compact()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _selected(self, where):
+        mask = self.rows > 0
+        for col, values in (where or {}).items():
+            if len(values):
+                mask &= self.keys[col].isin(list(values)).to_numpy()
+        return np.flatnonzero(mask)
+
+    def country_means(self, where=None, columns=WB_COLUMNS):
+        """Mean of each score per country over the selected rows."""
+        cells = self._selected(where)
+        positions = [CORR_COLUMNS.index(c) for c in columns]
+        countries = self.keys["Country"].iloc[cells]
+        counts = pd.DataFrame(self.counts[np.ix_(cells, positions)], columns=columns)
+        sums = pd.DataFrame(self.sums[np.ix_(cells, positions)], columns=columns)
+        by_country = countries.reset_index(drop=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (sums.groupby(by_country, observed=True).sum()
+                    / counts.groupby(by_country, observed=True).sum())
+
+    def correlation(self, where=None):
+        """Correlation of the scores over the selected rows with every score present."""
+        cells = self._selected(where)
+        _, _, comoments = _combine(self.complete[cells], self.means[cells], self.comoments[cells],
+                                   np.zeros(len(cells), dtype=np.int64), 1)
+        cov = comoments[0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(np.diag(cov))
+            matrix = np.clip(cov / np.outer(std, std), -1, 1)
+        return pd.DataFrame(matrix, index=pd.Index(CORR_COLUMNS, name="Score"), columns=CORR_COLUMNS)
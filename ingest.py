@@ -0,0 +1,176 @@
+"""Build typed columnar snapshots from the source CSVs.
+
+The CSVs in the repository are the build-time source of truth. This step
+parses them once, applies the calendar enrichment the dashboard needs,
+dictionary-encodes repeated strings and writes an uncompressed Arrow/Feather
+file that the loader can memory-map at startup instead of re-parsing text.
+
+Usage::
+
+    python ingest.py            # rebuild stale snapshots
+    python ingest.py --force    # rebuild everything
+"""
+
+import argparse
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import schema
+from instrumentation import span
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_DIR = os.path.join(BASE_DIR, "snapshots")
+SKF_CSV = os.path.join(BASE_DIR, "Cleaned_SKF_data.csv")
+TOPICS_CSV = os.path.join(BASE_DIR, "Topic_TopWords.csv")
+
+SNAPSHOT_FORMAT = "3"
+
+DATE_FORMAT = "%Y-%m-%d"
+MONTH_DTYPE = pd.CategoricalDtype(schema.MONTH_ORDER, ordered=True)
+
+# Strings repeated more often than this (unique / rows) are stored as categoricals.
+CATEGORY_RATIO = 0.5
+
+
+def snapshot_path(csv_path):
+    name = os.path.splitext(os.path.basename(csv_path))[0] + ".feather"
+    return os.path.join(SNAPSHOT_DIR, name)
+
+
+def file_digest(path, chunk_size=1 << 20):
+    sha = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def enrich_dates(data):
+    """Parse ``Date`` and derive the calendar columns from it.
+
+    Dates are parsed with the explicit ``DATE_FORMAT``; values that do not
+    match become NaT and their number is kept in
+    ``data.attrs["coerced_dates"]``. ``Year`` (int16) and ``Month_Num``
+    (int8) are compact integers, as is the year-month period key
+    ``Year_Month`` (int32, ``YYYYMM``); all three are float32 with NaN when
+    some dates are missing. ``Month`` is the month name looked up from
+    ``Month_Num`` in ``schema.MONTH_ORDER``.
+    """
+    raw = data["Date"]
+    dates = pd.to_datetime(raw, format=DATE_FORMAT, errors="coerce")
+    missing = dates.isna().to_numpy()
+    data.attrs["coerced_dates"] = int((missing & raw.notna().to_numpy()).sum())
+
+    year = dates.dt.year.to_numpy(dtype=np.float32, na_value=np.nan)
+    month = dates.dt.month.to_numpy(dtype=np.float32, na_value=np.nan)
+    period = year * 100 + month
+    data["Date"] = dates
+    data["Year"] = year if missing.any() else year.astype(np.int16)
+    data["Month_Num"] = month if missing.any() else month.astype(np.int8)  # for sorting months chronologically
+    data["Year_Month"] = period if missing.any() else period.astype(np.int32)
+    codes = np.where(missing, -1, np.nan_to_num(month, nan=1) - 1).astype(np.int8)
+    data["Month"] = pd.Categorical.from_codes(codes, dtype=MONTH_DTYPE)
+    return data
+
+
+def encode_strings(data):
+    """Dictionary-encode repeated strings not covered by the schema."""
+    for col in data.columns:
+        series = data[col]
+        if series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+            if series.nunique(dropna=True) <= CATEGORY_RATIO * max(len(series), 1):
+                data[col] = series.astype("category")
+    return data
+
+
+def read_source(csv_path):
+    """Parse a source CSV into the typed frame the dashboard works with."""
+    with span("parse_csv") as record:
+        data = pd.read_csv(csv_path)
+        record["rows_out"] = len(data)
+    if "Date" in data.columns:
+        with span("dates") as record:
+            data = enrich_dates(data)
+            record["coerced"] = data.attrs["coerced_dates"]
+    with span("encode"):
+        return encode_strings(schema.apply_schema(data))
+
+
+def write_snapshot(frame, csv_path, digest, path=None):
+    """Atomically write ``frame`` as the snapshot of ``csv_path``."""
+    path = path or snapshot_path(csv_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    st = os.stat(csv_path)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"skf_format": SNAPSHOT_FORMAT.encode(),
+        b"source_mtime_ns": str(st.st_mtime_ns).encode(),
+        b"source_size": str(st.st_size).encode(),
+        b"source_sha1": digest.encode(),
+        b"coerced_dates": str(frame.attrs.get("coerced_dates", 0)).encode(),
+    })
+    tmp = path + ".tmp"
+    # Uncompressed so that the file can be memory-mapped without decoding.
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, path)
+    return path
+
+
+def snapshot_metadata(path):
+    """Source information recorded in a snapshot, or None if unusable."""
+    try:
+        with pa.memory_map(path) as source:
+            meta = pa.ipc.open_file(source).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    if meta.get(b"skf_format", b"").decode() != SNAPSHOT_FORMAT:
+        return None
+    return {
+        "source_mtime_ns": int(meta[b"source_mtime_ns"]),
+        "source_size": int(meta[b"source_size"]),
+        "source_sha1": meta[b"source_sha1"].decode(),
+        "coerced_dates": int(meta.get(b"coerced_dates", 0)),
+    }
+
+
+def read_snapshot(path):
+    """Memory-map a snapshot; non-null numeric columns are zero-copy."""
+    with span("read_snapshot") as record:
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        record["rows_out"] = table.num_rows
+        frame = table.to_pandas(split_blocks=True)
+        frame.attrs["coerced_dates"] = int((table.schema.metadata or {}).get(b"coerced_dates", 0))
+        return frame
+
+
+def build(csv_path, force=False):
+    path = snapshot_path(csv_path)
+    digest = file_digest(csv_path)
+    meta = snapshot_metadata(path)
+    if not force and meta is not None and meta["source_sha1"] == digest:
+        return path, False
+    return write_snapshot(read_source(csv_path), csv_path, digest, path), True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--force", action="store_true", help="rebuild even if up to date")
+    args = parser.parse_args()
+    for csv_path in (SKF_CSV, TOPICS_CSV):
+        path, built = build(csv_path, force=args.force)
+        status = "built" if built else "up to date"
+        coerced = snapshot_metadata(path)["coerced_dates"]
+        if coerced:
+            status += f", {coerced:,} unparseable dates"
+        print(f"{os.path.relpath(path, BASE_DIR)}: {status} ({os.path.getsize(path):,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""Per-rerun timing spans, metrics and profiling for the dashboard.
+
+Every rerun of ``dashboard.py`` opens a trace. Code on the hot path wraps its
+stages in ``span(...)`` blocks (load, parse, filter, aggregate, figure build,
+chart emit), optionally recording rows in/out or bytes. Spans nest; a span's
+"self" time excludes its children. Outside a rerun, e.g. in ``ingest.py`` or
+the benchmarks, ``span`` does nothing.
+
+Finished traces go to three optional sinks:
+
+* the debug sidebar panel (``?debug=1`` or ``SKF_DEBUG=1``);
+* one JSON line per rerun on the ``skf.spans`` logger, written to the file
+  named by ``SKF_SPAN_LOG``;
+* process-wide counters served in Prometheus text format on
+  ``http://localhost:$SKF_METRICS_PORT/metrics``.
+
+A rerun can also be profiled with cProfile, or pyinstrument when installed.
+"""
+
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import weakref
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("skf.spans")
+
+_current = contextvars.ContextVar("skf_trace", default=None)
+_lock = threading.Lock()
+_configured = False
+_metrics_server = None
+# (section, span) -> {"count", "seconds", "rows_out", "bytes"}
+_metrics = defaultdict(lambda: {"count": 0, "seconds": 0.0, "rows_out": 0, "bytes": 0})
+_figure_bytes = {}  # id(figure) -> JSON size, dropped with the figure
+
+
+class Trace:
+    """Spans recorded during one rerun, in start order."""
+
+    def __init__(self, section=None, detailed=False):
+        self.section = section
+        self.detailed = detailed  # measure costly fields such as figure bytes
+        self.spans = []
+        self.depth = 0
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.total_ms = None
+
+    def self_times(self):
+        """Each span's duration minus that of its direct children."""
+        own = [s["ms"] for s in self.spans]
+        for i, s in enumerate(self.spans):
+            for child in self.spans[i + 1:]:
+                if child["depth"] <= s["depth"]:
+                    break
+                if child["depth"] == s["depth"] + 1:
+                    own[i] -= child["ms"]
+        return own
+
+    def table(self):
+        """Rows for display: indented name, total and self time, counters."""
+        rows = []
+        for record, own in zip(self.spans, self.self_times()):
+            extra = {k: v for k, v in record.items()
+                     if k not in ("name", "depth", "ms", "rows_in", "rows_out", "bytes")}
+            rows.append({
+                "span": "· " * record["depth"] + record["name"],
+                "ms": round(record["ms"], 2),
+                "self ms": round(own, 2),
+                "rows in": record.get("rows_in"),
+                "rows out": record.get("rows_out"),
+                "bytes": record.get("bytes"),
+                "details": " ".join(f"{k}={v}" for k, v in extra.items()),
+            })
+        return rows
+
+    def as_dict(self):
+        return {
+            "ts": round(self.started, 3),
+            "section": self.section,
+            "total_ms": self.total_ms,
+            "spans": self.spans,
+        }
+
+
+@contextmanager
+def span(name, **fields):
+    """Time a stage of the current rerun.
+
+    Yields the span record; assign to it (e.g. ``record["rows_out"] = n``)
+    to attach measurements known only at the end.
+    """
+    trace = _current.get()
+    if trace is None:
+        yield {}
+        return
+    record = {"name": name, "depth": trace.depth, **fields}
+    trace.spans.append(record)
+    trace.depth += 1
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["ms"] = (time.perf_counter() - start) * 1000
+        trace.depth -= 1
+
+
+def debug_requested(query_params):
+    """Whether the debug panel is enabled for this session."""
+    return query_params.get("debug") == "1" or os.environ.get("SKF_DEBUG") == "1"
+
+
+def figure_bytes(fig):
+    """Size of the figure's JSON, computed once per figure object."""
+    key = id(fig)
+    if key not in _figure_bytes:
+        # Figures define __eq__ and are unhashable, so key them by identity.
+        _figure_bytes[key] = len(fig.to_json().encode("utf-8"))
+        weakref.finalize(fig, _figure_bytes.pop, key, None)
+    return _figure_bytes[key]
+
+
+# --- Rerun lifecycle ---
+
+def _configure():
+    global _configured
+    with _lock:
+        if _configured:
+            return
+        _configured = True
+    path = os.environ.get("SKF_SPAN_LOG")
+    if path:
+        handler = logging.FileHandler(path)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    port = os.environ.get("SKF_METRICS_PORT")
+    if port:
+        serve_metrics(int(port))
+
+
+def sinks_enabled():
+    return logger.isEnabledFor(logging.INFO) or _metrics_server is not None
+
+
+def begin_rerun(detailed=False):
+    """Start the trace of a rerun of the script in this thread."""
+    _configure()
+    trace = Trace(detailed=detailed or sinks_enabled())
+    _current.set(trace)
+    return trace
+
+
+def end_rerun(trace):
+    """Close ``trace`` and hand it to the log and metrics sinks."""
+    trace.total_ms = (time.perf_counter() - trace._start) * 1000
+    _current.set(None)
+    with _lock:
+        for record in trace.spans:
+            m = _metrics[(trace.section, record["name"])]
+            m["count"] += 1
+            m["seconds"] += record["ms"] / 1000
+            m["rows_out"] += record.get("rows_out") or 0
+            m["bytes"] += record.get("bytes") or 0
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(trace.as_dict(), default=str))
+    return trace
+
+
+# --- Metrics endpoint ---
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def metrics_text():
+    """Span counters in the Prometheus text exposition format."""
+    series = [
+        ("skf_span_count_total", "count", "Spans recorded."),
+        ("skf_span_seconds_total", "seconds", "Wall time spent in spans."),
+        ("skf_span_rows_out_total", "rows_out", "Rows produced by spans."),
+        ("skf_span_bytes_total", "bytes", "Chart payload bytes emitted by spans."),
+    ]
+    with _lock:
+        items = sorted(_metrics.items(), key=lambda kv: (str(kv[0][0]), kv[0][1]))
+        lines = []
+        for metric, field, help_text in series:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for (section, name), m in items:
+                lines.append(f'{metric}{{section="{_label(section)}",span="{_label(name)}"}} {m[field]}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """Serve ``/metrics`` from a background thread (once per process)."""
+    global _metrics_server
+    with _lock:
+        if _metrics_server is not None:
+            return _metrics_server
+        try:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError:
+            # Port taken, e.g. by another server process on this host.
+            logger.warning("metrics endpoint not started: port %s unavailable", port)
+            return None
+    threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+    return _metrics_server
+
+
+# --- Profiling ---
+
+def profiler_engines():
+    """Profilers available in this environment."""
+    engines = ["cProfile"]
+    try:
+        import pyinstrument  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        engines.append("pyinstrument")
+    return engines
+
+
+class Profiler:
+    """Profile of one rerun, rendered as text."""
+
+    def __init__(self, engine="cProfile"):
+        self.engine = engine
+        if engine == "pyinstrument":
+            import pyinstrument
+            self._profiler = pyinstrument.Profiler()
+        else:
+            self._profiler = cProfile.Profile()
+
+    def start(self):
+        if self.engine == "pyinstrument":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+        return self
+
+    def stop(self, limit=40):
+        if self.engine == "pyinstrument":
+            self._profiler.stop()
+            return self._profiler.output_text(unicode=True, color=False)
+        self._profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
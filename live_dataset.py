@@ -0,0 +1,135 @@
+"""In-memory serving of the partitioned dataset, refreshed partition by partition.
+
+The dashboard normally loads one snapshot of the whole CSV and rebuilds its
+filter index, cube and dimension table whenever the file changes. Served
+from the partitioned dataset of ``dataset_store.py`` instead
+(``SKF_DATASET=<dir> SKF_ENGINE=memory``), each Year/Month partition is
+loaded and indexed on its own:
+
+* a ``filter_index.FilterIndex``, ``cube.Cube``,
+  ``dimensions.DimensionTable`` and ``governance_stats.GovernanceStats``
+  per partition;
+* the dashboard-wide structures are stacked from the parts
+  (``PartitionedIndex``, ``Cube.concat``, ``DimensionTable.concat``,
+  ``GovernanceStats.concat``), which costs time in the number of cells and
+  entries, not rows.
+
+When ``dataset_store.py append`` writes a new manifest, the next rerun
+reloads only the partitions whose generation changed and keeps every other
+part as it is. The flat frame used by Raw Data and exports is assembled
+from the parts on first use after a change.
+"""
+
+import os
+import threading
+from functools import cached_property
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import schema
+from cube import Cube
+from dataset_store import DATASET_DIR, MANIFEST, manifest_version, partition_files, partition_order, read_manifest
+from dimensions import DimensionTable
+from filter_index import FilterIndex, PartitionedIndex
+from governance_stats import GovernanceStats
+from instrumentation import span
+
+
+class Part:
+    """One partition's rows and the structures derived from them."""
+
+    def __init__(self, directory, entry, columns):
+        self.generation = entry["generation"]
+        table = pa.concat_tables(pq.ParquetFile(path).read() for path in partition_files(directory, entry))
+        frame = table.to_pandas()
+        for col, dtype in (("Year", np.int16), ("Month_Num", np.int8)):
+            frame[col] = np.nan if entry[col] is None else dtype(entry[col])
+        frame = schema.apply_schema(frame[columns])
+        self.dimension = DimensionTable(frame)
+        self.facts = frame.drop(columns=self.dimension.columns)
+        self.index = FilterIndex(self.facts)
+        self.cube = Cube(self.facts)
+        self.governance_stats = GovernanceStats.from_dimension(self.facts, self.dimension)
+
+    def __len__(self):
+        return len(self.facts)
+
+
+class LiveState:
+    """Consistent view of one dataset version, shared read-only by reruns."""
+
+    def __init__(self, version, parts, columns):
+        self.version = version
+        self.parts = parts
+        self.columns = columns
+        ordered = list(parts.values())
+        self.filter_index = PartitionedIndex(p.index for p in ordered)
+        self.cube = Cube.concat(p.cube for p in ordered)
+        self.dimension = DimensionTable.concat((p.dimension for p in ordered), columns)
+
+    def __len__(self):
+        return self.filter_index.n_rows
+
+    @cached_property
+    def governance_stats(self):
+        return GovernanceStats.concat(p.governance_stats for p in self.parts.values())
+
+    @cached_property
+    def data(self):
+        """Fact rows of every partition, in partition order."""
+        with span("assemble", parts=len(self.parts)) as record:
+            frames = []
+            for part in self.parts.values():
+                # Attributes the stacked dimension does not hold stay in the facts.
+                extra = [c for c in part.dimension.columns if c not in self.dimension.columns]
+                frames.append(part.facts.assign(**{c: part.dimension.column(c) for c in extra}))
+            data = schema.concat_frames(frames)
+            record["rows_out"] = len(data)
+            return data
+
+
+class LiveDataset:
+    def __init__(self, directory=DATASET_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._stat = None
+        self._state = None
+
+    def current(self):
+        """State of the latest manifest, refreshing changed partitions first."""
+        st = os.stat(os.path.join(self.directory, MANIFEST))
+        stat = st.st_mtime_ns, st.st_size
+        with self._lock:
+            if self._state is None or stat != self._stat:
+                manifest = read_manifest(self.directory)
+                if self._state is None or manifest_version(manifest) != self._state.version:
+                    self._state = self._refresh(manifest)
+                self._stat = stat
+            return self._state
+
+    def _refresh(self, manifest):
+        previous = self._state.parts if self._state is not None else {}
+        parts = {}
+        with span("refresh partitions", partitions=len(manifest["partitions"])) as record:
+            loaded = 0
+            for name, entry in sorted(manifest["partitions"].items(), key=lambda kv: partition_order(kv[1])):
+                part = previous.get(name)
+                if part is None or part.generation != entry["generation"]:
+                    part = Part(self.directory, entry, manifest["columns"])
+                    loaded += 1
+                parts[name] = part
+            record["loaded"] = loaded
+            return LiveState(manifest_version(manifest), parts, manifest["columns"])
+
+
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+
+def open_live(directory=DATASET_DIR):
+    """Current state of ``directory``, shared by every session."""
+    with _datasets_lock:
+        live = _datasets.setdefault(directory, LiveDataset(directory))
+    return live.current()
@@ -0,0 +1,187 @@
+"""Batched aggregation of the charts of one section.
+
+A section such as Cross Analysis asks for several top-N rankings (the same
+dimension with different N) and several crosstabs restricted to those top
+values. Asked one at a time, every ranking and every crosstab is its own
+roll-up of the backend: a pass over the filtered cube cells, or a scan of
+the partitioned dataset.
+
+A ``Plan`` collects what a section needs first and answers all of it from
+one ``CellSlice``: the filtered cells of the backend at the grain of every
+dimension the plan uses, taken in one pass (a mask of the cube's cells, or
+one grouped scan for the scan engine). Rankings are one ``bincount`` per
+dimension, shared by every N asked for, and crosstabs group the integer
+codes of the slice in place of filtered copies. ``stats()`` counts the
+roll-up passes this saved.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+
+_lock = threading.Lock()
+_stats = {"plans": 0, "aggregates": 0, "passes": 0, "passes_saved": 0}
+
+
+def dimension_codes(series):
+    """Integer codes of a dimension column and what decodes them.
+
+    Codes follow the order ``groupby(sort=True)`` gives the values, so
+    rankings and crosstabs break ties and order groups like a roll-up.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.dtype
+    codes, uniques = pd.factorize(series, sort=True)
+    return codes, uniques
+
+
+def decode(codes, values):
+    if isinstance(values, pd.CategoricalDtype):
+        return pd.Categorical.from_codes(codes, dtype=values)
+    return values.take(codes)
+
+
+def n_values(values):
+    return len(values.categories) if isinstance(values, pd.CategoricalDtype) else len(values)
+
+
+class CellSlice:
+    """The cells of a backend that match a filter.
+
+    ``codes`` maps every dimension of the slice to its cells' codes and the
+    values they decode to (``dimension_codes``); ``rows`` and ``victims``
+    are the measures of each cell. ``count_distinct(positions, groups,
+    n_groups)`` counts the distinct violations of the cells at
+    ``positions`` per group, like ``cube.distinct.count``.
+    """
+
+    def __init__(self, codes, rows, victims, count_distinct):
+        self.codes = codes
+        self.rows = rows
+        self.victims = victims
+        self.count_distinct = count_distinct
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class Plan:
+    """The rankings and crosstabs of one section, computed together.
+
+    Declare the crosstabs with ``crosstab``, then ``run`` the plan on a
+    backend; the result's ``top(dim, n)`` and ``tables`` match
+    ``Aggregates.top`` and the corresponding ``rollup`` restricted to the
+    top values.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.crosstabs = {}  # name -> (by, measure, {dim: n})
+        self.depth = {}      # dim -> largest N asked for
+        self.aggregates = 0  # roll-ups the section would run one at a time
+
+    def top(self, dim, n):
+        """Ask for the ``n`` largest values of ``dim`` by rows."""
+        self.depth[dim] = max(self.depth.get(dim, 0), n)
+        self.aggregates += 1
+
+    def crosstab(self, name, by, measure, top):
+        """Ask for ``measure`` grouped by ``by``, over the ``top`` ({dim: n}) values."""
+        for dim, n in top.items():
+            self.top(dim, n)
+        self.crosstabs[name] = (list(by), measure, dict(top))
+        self.aggregates += 1
+
+    def dimensions(self):
+        return list(dict.fromkeys([d for by, _, _ in self.crosstabs.values() for d in by] + list(self.depth)))
+
+    def run(self, cube, where):
+        with span("plan", section=self.name, aggregates=self.aggregates) as record:
+            cells = cube.cell_slice(self.dimensions(), where)
+            if cells is None:
+                result = self._run_separately(cube, where)
+                passes = self.aggregates
+            else:
+                result = self._run_on(cells)
+                passes = 1
+            record["passes_saved"] = self.aggregates - passes
+        with _lock:
+            _stats["plans"] += 1
+            _stats["aggregates"] += self.aggregates
+            _stats["passes"] += passes
+            _stats["passes_saved"] += self.aggregates - passes
+        return result
+
+    def _run_separately(self, cube, where):
+        """One roll-up per aggregate, for backends without ``cell_slice``."""
+        ranks = {}
+        tables = {}
+        for name, (by, measure, top) in self.crosstabs.items():
+            restrict = {}
+            for dim, n in top.items():
+                ranks[dim, n] = restrict[dim] = cube.top(dim, n, where).index
+            tables[name] = cube.rollup(by, {**where, **restrict})[by + [measure]]
+        return PlanResult(ranks, tables)
+
+    def _run_on(self, cells):
+        # Rankings: rows per value of each dimension, ordered like top()
+        ranked = {}
+        for dim in self.depth:
+            codes, values = cells.codes[dim]
+            valid = codes >= 0
+            counts = np.bincount(codes[valid], weights=cells.rows[valid], minlength=n_values(values))
+            order = np.argsort(-counts, kind="stable")
+            ranked[dim] = order[counts[order] > 0]
+
+        ranks = {}
+        tables = {}
+        for name, (by, measure, top) in self.crosstabs.items():
+            keep = np.ones(len(cells), dtype=bool)
+            for dim in by:
+                keep &= cells.codes[dim][0] >= 0
+            for dim, n in top.items():
+                chosen = ranked[dim][:n]
+                ranks[dim, n] = pd.Index(decode(chosen, cells.codes[dim][1]), name=dim)
+                allowed = np.zeros(n_values(cells.codes[dim][1]), dtype=bool)
+                allowed[chosen] = True
+                keep &= allowed[np.maximum(cells.codes[dim][0], 0)]
+            positions = np.flatnonzero(keep)
+
+            # Group key: the codes of ``by`` combined in mixed radix
+            key = np.zeros(len(positions), dtype=np.int64)
+            for dim in by:
+                key = key * n_values(cells.codes[dim][1]) + cells.codes[dim][0][positions]
+            keys, groups = np.unique(key, return_inverse=True)
+            if measure == "violations":
+                values = cells.count_distinct(positions, groups, len(keys))
+            else:
+                values = np.bincount(groups, weights=getattr(cells, measure)[positions], minlength=len(keys))
+                values = values.astype(cells.rows.dtype if measure == "rows" else np.float64)
+
+            columns = {}
+            for dim in reversed(by):
+                radix = n_values(cells.codes[dim][1])
+                columns[dim] = decode(keys % radix, cells.codes[dim][1])
+                keys = keys // radix
+            table = pd.DataFrame({dim: columns[dim] for dim in by})
+            table[measure] = values
+            tables[name] = table
+        return PlanResult(ranks, tables)
+
+
+class PlanResult:
+    def __init__(self, ranks, tables):
+        self.ranks = ranks
+        self.tables = tables
+
+    def top(self, dim, n):
+        return self.ranks[dim, n]
+
+
+def stats():
+    """Plans run by this process and the roll-up passes they saved."""
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,125 @@
+"""The numbers behind each dashboard section, as tables.
+
+Every chart of a section is drawn from a few roll-ups of the cube (or, for
+Governance, from the cells of ``governance_stats.GovernanceStats``).
+The functions here compute those tables without Streamlit or Plotly: the
+figure builders in ``charts.py`` draw them, and ``api.py`` serves them to
+other tools as JSON or Arrow. Each returns ``{table name: DataFrame}``.
+
+``SECTIONS`` maps the API name of a section to its query and the options it
+takes; ``run`` answers one from a ``backend.Source``.
+"""
+
+import pandas as pd
+
+from instrumentation import span
+from planner import Plan
+
+TREND_METRICS = ["Violations", "Victims"]
+TREND_UNITS = ["Yearly", "Monthly"]
+
+
+def _counts(series, label, name="Count"):
+    """A ``top()`` series as a two-column table."""
+    out = series.reset_index()
+    out.columns = [label, name]
+    return out
+
+
+def overview(cube, where):
+    """Totals and the top values charted by the Overview."""
+    totals = cube.totals(where)
+    return {
+        "totals": pd.DataFrame([{
+            "violations": totals["violations"],
+            "victims": totals["victims"],
+            "countries": len(cube.top("Country", where=where)),
+        }]),
+        "gender": _counts(cube.top("Gender", where=where), "Gender"),
+        "violation_types": _counts(cube.top("Violation_Nature", 5, where), "Violation Type"),
+        "countries": _counts(cube.top("Country", 5, where), "Country"),
+        "attackers": _counts(cube.top("Attackers", 5, where), "Attacker"),
+    }
+
+
+def trends(cube, where, metric="Violations", unit="Yearly"):
+    """Violations or victims per country and year (or month), in time order."""
+    measure = "victims" if metric == "Victims" else "violations"
+    if unit == "Yearly":
+        by = ["Year", "Country"]
+        series = cube.rollup(by, where)
+    else:
+        by = ["Year", "Month_Num", "Country"]
+        series = cube.rollup(by, where).sort_values(["Year", "Month_Num"], kind="stable")
+    return {"series": series[by + [measure]].reset_index(drop=True)}
+
+
+def violation_patterns(cube, where):
+    """Top violation types per year, and crossed with attackers and occupations."""
+    plan = Plan("Violation Patterns")
+    plan.crosstab("types_by_year", ["Year", "Violation_Nature"], "violations",
+                  top={"Violation_Nature": 5})
+    plan.crosstab("types_by_attacker", ["Violation_Nature", "Attackers"], "rows",
+                  top={"Attackers": 6, "Violation_Nature": 6})
+    plan.crosstab("types_by_occupation", ["Violation_Nature", "Victim_Occupation"], "rows",
+                  top={"Violation_Nature": 10, "Victim_Occupation": 10})
+    result = plan.run(cube, where)
+    return {
+        name: result.tables[name].rename(columns={measure: "Count"})
+        for name, (_, measure, _) in plan.crosstabs.items()
+    }
+
+
+CROSSTABS = {
+    # name: (rows, columns, top N of each restricted dimension)
+    "types_by_country": ("Violation_Nature", "Country", {"Country": 10, "Violation_Nature": 10}),
+    "attackers_by_occupation": ("Attackers", "Victim_Occupation", {"Attackers": 10, "Victim_Occupation": 10}),
+    "types_by_gender": ("Violation_Nature", "Gender", {"Violation_Nature": 10}),
+    "attackers_by_gender": ("Attackers", "Gender", {"Attackers": 10}),
+}
+
+
+def cross_analysis(cube, where):
+    """Violations crossing the top 10 violation types, countries, attackers, occupations and gender."""
+    plan = Plan("Cross Analysis")
+    for name, (rows, columns, top) in CROSSTABS.items():
+        plan.crosstab(name, [rows, columns], "violations", top=top)
+    result = plan.run(cube, where)
+    return {
+        name: result.tables[name]
+        .pivot_table(index=rows, columns=columns, values="violations",
+                     aggfunc="sum", fill_value=0, observed=True)
+        .reindex(index=result.top(rows, top[rows]))
+        for name, (rows, columns, top) in CROSSTABS.items()
+    }
+
+
+def governance(stats, where):
+    """Mean World Bank scores per country and the RSF/governance correlations.
+
+    ``stats`` is the backend's ``GovernanceStats``; both tables equal those
+    over the selected rows and are merged from its cells.
+    """
+    with span("aggregate", by="Country", cells_in=len(stats)):
+        country_means = stats.country_means(where).round(2).reset_index()
+    with span("aggregate", by="corr", cells_in=len(stats)):
+        correlation = stats.correlation(where)
+    return {"country_means": country_means, "correlation": correlation}
+
+
+# API name -> (query, {option: allowed values}); the first value is the default
+SECTIONS = {
+    "overview": (overview, {}),
+    "trends": (trends, {"metric": TREND_METRICS, "unit": TREND_UNITS}),
+    "violation-patterns": (violation_patterns, {}),
+    "cross-analysis": (cross_analysis, {}),
+    "governance": (governance, {}),
+}
+
+
+def run(source, section, where, **options):
+    """Tables of ``section`` for the filter ``where`` on ``source``."""
+    query, _ = SECTIONS[section]
+    if query is governance:
+        return governance(source.governance_stats(), where)
+    return query(source.cube(), where, **options)
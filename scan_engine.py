@@ -0,0 +1,331 @@
+"""Out-of-core query engine over a partitioned Parquet copy of the log.
+
+For archives that do not fit in memory, the violations CSV is converted in
+bounded chunks into a Hive-partitioned Parquet dataset
+(``Year=…/Month_Num=…/part-….parquet``, rows sorted by Country inside each
+file). Queries are then answered by Arrow's streaming engine (Acero)
+directly from the files:
+
+* Year and Month filters prune whole partitions;
+* Country and other dimension filters are pushed down to Parquet row-group
+  statistics, then applied per batch;
+* only the columns a query needs are read, batch by batch, and aggregated
+  into per-group state (row counts, victim sums, exact distinct
+  ``Violation_ID`` counts).
+
+``ScanEngine`` exposes the same ``rollup`` / ``totals`` / ``top`` interface
+as ``cube.Cube``, the sidebar lookups of ``filter_index.FilterIndex`` and
+the paging/export hooks of the Raw Data view, so the dashboard can run on
+it unchanged (``SKF_DATASET=<dir> streamlit run dashboard.py``). Peak
+memory depends on the number of groups, not on the number of rows.
+
+The dataset is built and updated by ``dataset_store.py``. An engine reads
+the files listed in the manifest it was opened with; ``open_engine``
+reopens it after a write and carries over the per-partition lookups of
+partitions that did not change.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.acero as ac
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+import schema
+from cube import Aggregates
+from dataset_store import (
+    DATASET_DIR, PARTITIONING, partition_files, partition_order, manifest_version, read_manifest,
+)
+from dimensions import COUNTRY_ATTRIBUTES, DIMENSION_KEY
+from governance_stats import CORR_COLUMNS, GovernanceStats
+from instrumentation import span
+from planner import CellSlice, dimension_codes
+
+
+def _python_values(values):
+    return [v.item() if isinstance(v, np.generic) else v for v in values]
+
+
+def _project(columns):
+    """Keep only ``columns`` of a scan's batches.
+
+    The scan node also emits the other columns and the partition fields;
+    grouping directly on them segfaults (pyarrow 25) when a fragment's
+    partition value is null, as in the undated partition.
+    """
+    return ac.Declaration("project", ac.ProjectNodeOptions([pc.field(c) for c in columns], columns))
+
+
+def _as_dimensions(frame):
+    """Recode dimension columns of a query result like the in-memory schema."""
+    for col, order in schema.DIMENSIONS.items():
+        if col in frame.columns:
+            frame[col] = schema.encode_dimension(frame[col], order)
+    return frame
+
+
+class ScanEngine(Aggregates):
+    def __init__(self, directory=DATASET_DIR, previous=None):
+        self.directory = directory
+        self.manifest = read_manifest(directory)
+        entries = sorted(self.manifest["partitions"].values(), key=partition_order)
+        self.dataset = ds.dataset(
+            [path for entry in entries for path in partition_files(directory, entry)],
+            format="parquet", partitioning=PARTITIONING, partition_base_dir=directory,
+        )
+        self.columns = self.manifest["columns"] or self.dataset.schema.names
+        self.version = manifest_version(self.manifest)
+        self._partitions = self.manifest["partitions"]
+        self._values = {}
+        self._governance = None
+        # partition name -> (generation, GovernanceStats of the partition)
+        self._governance_parts = {}
+        if previous is not None:
+            self._governance_parts = {
+                name: part for name, part in previous._governance_parts.items()
+                if name in self._partitions and self._partitions[name]["generation"] == part[0]
+            }
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    def stale(self):
+        """Whether the dataset on disk was written to since this engine opened it."""
+        try:
+            return read_manifest(self.directory) != self.manifest
+        except (OSError, ValueError):
+            return True
+
+    # Filters
+
+    def _expression(self, where):
+        expr = None
+        for col, values in (where or {}).items():
+            if values is None or len(values) == 0:
+                continue
+            values = _python_values(values)
+            if col == "Month":
+                # Month names live in the Month_Num partition key.
+                col = "Month_Num"
+                values = [schema.MONTH_ORDER.index(m) + 1 for m in values if m in schema.MONTH_ORDER]
+            cond = pc.field(col).isin(values)
+            expr = cond if expr is None else expr & cond
+        return expr
+
+    def _scan(self, columns, where):
+        expr = self._expression(where)
+        scan = ac.Declaration("scan", ac.ScanNodeOptions(self.dataset, columns=columns, filter=expr))
+        if expr is None:
+            return [scan, _project(columns)]
+        return [scan, ac.Declaration("filter", ac.FilterNodeOptions(expr)), _project(columns)]
+
+    # Sidebar lookups (FilterIndex interface)
+
+    def values(self, column):
+        if column not in self._values:
+            if column in ("Year", "Month_Num"):
+                found = {p[column] for p in self._partitions.values() if p[column] is not None}
+            elif column == "Country":
+                found = {c for p in self._partitions.values() for c in p["countries"]}
+            else:
+                table = ac.Declaration.from_sequence(self._scan([column], None) + [
+                    ac.Declaration("aggregate", ac.AggregateNodeOptions([], keys=[column])),
+                ]).to_table()
+                found = {v for v in table.column(column).to_pylist() if v is not None}
+            if column == "Month":
+                self._values[column] = [m for m in schema.MONTH_ORDER if m in found]
+            else:
+                self._values[column] = sorted(found)
+        return list(self._values[column])
+
+    def available_months(self, years=None):
+        nums = {
+            p["Month_Num"] for p in self._partitions.values()
+            if p["Month_Num"] is not None and (not years or p["Year"] in set(years))
+        }
+        return [m for i, m in enumerate(schema.MONTH_ORDER, 1) if i in nums]
+
+    def count(self, **where):
+        return self.dataset.count_rows(filter=self._expression(where))
+
+    # Aggregation (Cube interface)
+
+    def _aggregate(self, by, where):
+        if by:
+            aggregates = [
+                ("Violation_ID", "hash_count", pc.CountOptions(mode="all"), "rows"),
+                ("Total_Victims", "hash_sum", pc.ScalarAggregateOptions(min_count=0), "victims"),
+                ("Violation_ID", "hash_count_distinct", pc.CountOptions(mode="only_valid"), "violations"),
+            ]
+        else:
+            aggregates = [
+                ("Violation_ID", "count", pc.CountOptions(mode="all"), "rows"),
+                ("Total_Victims", "sum", pc.ScalarAggregateOptions(min_count=0), "victims"),
+                ("Violation_ID", "count_distinct", pc.CountOptions(mode="only_valid"), "violations"),
+            ]
+        columns = list(dict.fromkeys(by + ["Violation_ID", "Total_Victims"]))
+        table = ac.Declaration.from_sequence(self._scan(columns, where) + [
+            ac.Declaration("aggregate", ac.AggregateNodeOptions(aggregates, keys=by)),
+        ]).to_table()
+        out = table.to_pandas()
+        if by:
+            out = out.dropna(subset=by)
+        out["rows"] = out["rows"].astype(np.int64)
+        out["victims"] = out["victims"].astype(float)
+        out["violations"] = out["violations"].astype(np.int64)
+        return out
+
+    def cell_slice(self, dims, where=None):
+        """One scan grouping the rows matching ``where`` by ``dims`` and ``Violation_ID``.
+
+        Each output group holds a single id, so distinct violations of any
+        coarser grouping are counted from the groups' id codes.
+        """
+        keys = list(dims) + ["Violation_ID"]
+        aggregates = [
+            ("Violation_ID", "hash_count", pc.CountOptions(mode="all"), "rows"),
+            ("Total_Victims", "hash_sum", pc.ScalarAggregateOptions(min_count=0), "victims"),
+        ]
+        with span("aggregate", by=",".join(keys), engine="scan") as record:
+            facts = ac.Declaration.from_sequence(self._scan(keys + ["Total_Victims"], where) + [
+                ac.Declaration("aggregate", ac.AggregateNodeOptions(aggregates, keys=keys)),
+            ]).to_table().to_pandas()
+            record["rows_out"] = len(facts)
+        facts = _as_dimensions(facts)
+        ids, uniques = pd.factorize(facts["Violation_ID"])
+        n_ids = max(len(uniques), 1)
+
+        def count_distinct(positions, groups, n_groups):
+            valid = ids[positions] >= 0
+            pairs = np.unique(groups[valid] * n_ids + ids[positions][valid])
+            return np.bincount(pairs // n_ids, minlength=n_groups)
+
+        return CellSlice(
+            {dim: dimension_codes(facts[dim]) for dim in dims},
+            facts["rows"].to_numpy(dtype=np.int64),
+            facts["victims"].to_numpy(dtype=float),
+            count_distinct,
+        )
+
+    def rollup(self, by, where=None):
+        """Measures grouped by ``by`` for the filter ``where``, like ``Cube.rollup``."""
+        by = list(by)
+        with span("aggregate", by=",".join(by), engine="scan") as record:
+            out = self._aggregate(by, where)
+            if by:
+                out = _as_dimensions(out).sort_values(by, kind="stable").reset_index(drop=True)
+            record["rows_out"] = len(out)
+            return out[by + ["rows", "victims", "violations"]]
+
+    # Governance statistics
+
+    def _governance_part(self, entry, attributes):
+        """Per-key rows and values of ``attributes`` within one partition."""
+        part = ds.dataset(
+            partition_files(self.directory, entry),
+            format="parquet", partitioning=PARTITIONING, partition_base_dir=self.directory,
+        )
+        aggregates = [(DIMENSION_KEY[0], "hash_count", pc.CountOptions(mode="all"), "rows")]
+        aggregates += [(c, "hash_min", None, c) for c in attributes]
+        columns = DIMENSION_KEY + attributes
+        return ac.Declaration.from_sequence([
+            ac.Declaration("scan", ac.ScanNodeOptions(part, columns=columns)),
+            _project(columns),
+            ac.Declaration("aggregate", ac.AggregateNodeOptions(aggregates, keys=DIMENSION_KEY)),
+        ]).to_table().to_pandas()
+
+    def governance_stats(self):
+        """``GovernanceStats`` of the dataset, stacked from the partitions'.
+
+        Partitions are scanned only when not seen before.
+        """
+        if self._governance is None:
+            attributes = [c for c in COUNTRY_ATTRIBUTES if c in self.dataset.schema.names]
+            parts = []
+            for name, entry in self._partitions.items():
+                cached = self._governance_parts.get(name)
+                if cached is None:
+                    with span("scan governance", partition=name):
+                        frame = self._governance_part(entry, attributes)
+                        # One month per partition: its rows form Country x Year x Month cells
+                        month = None if entry["Month_Num"] is None else schema.MONTH_ORDER[int(entry["Month_Num"]) - 1]
+                        keys = _as_dimensions(frame[DIMENSION_KEY].assign(Month=month))
+                        stats = GovernanceStats(keys, frame.reindex(columns=CORR_COLUMNS).to_numpy(dtype=float),
+                                                frame["rows"])
+                        cached = (entry["generation"], stats)
+                    self._governance_parts[name] = cached
+                parts.append(cached[1])
+            self._governance = GovernanceStats.concat(parts)
+        return self._governance
+
+    # Raw rows (Raw Data view and export)
+
+    def page(self, where, page, page_size, columns=None, sort_by=None, ascending=True):
+        """One page of the selected rows, optionally sorted, read batch by batch."""
+        columns = list(columns or self.columns)
+        start = (page - 1) * page_size
+        with span("scan page", engine="scan") as record:
+            if sort_by is None:
+                n = self.count(**where)
+                indices = pa.array(np.arange(start, min(start + page_size, n)))
+                scanner = self.dataset.scanner(columns=columns, filter=self._expression(where))
+                frame = scanner.take(indices).to_pandas()
+            else:
+                table = self._top_rows(where, columns, sort_by, ascending, start + page_size)
+                frame = table.slice(start, page_size).select(columns).to_pandas()
+            record["rows_out"] = len(frame)
+            return _as_dimensions(frame.reset_index(drop=True))
+
+    def _top_rows(self, where, columns, sort_by, ascending, keep):
+        """First ``keep`` selected rows in sort order, merged batch by batch.
+
+        Sorting is stable with missing values last, and calendar dimensions
+        sort in calendar order, like the in-memory view.
+        """
+        order = schema.DIMENSIONS.get(sort_by)
+        key = "__sort_key" if order else sort_by
+        sort_keys = [(key, "ascending" if ascending else "descending", "at_end")]
+        needed = list(dict.fromkeys(columns + [sort_by]))
+        scanner = self.dataset.scanner(columns=needed, filter=self._expression(where))
+        best = None
+        for batch in scanner.to_batches():
+            table = pa.Table.from_batches([batch])
+            if order:
+                table = table.append_column(key, pc.index_in(table[sort_by], value_set=pa.array(order)))
+            if best is not None:
+                table = pa.concat_tables([best, table])
+            indices = pc.sort_indices(table, sort_keys=sort_keys)
+            best = table.take(indices[:keep])
+        if best is None:
+            return self.dataset.schema.empty_table().select(needed)
+        return best
+
+    def iter_frames(self, where, columns=None, encode=True):
+        """Selected rows as pandas frames, one Arrow batch at a time."""
+        columns = list(columns or self.columns)
+        scanner = self.dataset.scanner(columns=columns, filter=self._expression(where))
+        for batch in scanner.to_batches():
+            if batch.num_rows:
+                frame = batch.to_pandas()
+                yield _as_dimensions(frame) if encode else frame
+
+    def export_source(self, where):
+        """``(template, chunks)`` for ``export.ExportCache``, as plain strings."""
+        template = self.dataset.schema.empty_table().to_pandas()[self.columns]
+        return template, self.iter_frames(where, encode=False)
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def open_engine(directory=DATASET_DIR):
+    """Engine over ``directory`` shared by every session, reopened after a write."""
+    with _engines_lock:
+        engine = _engines.get(directory)
+        if engine is None or engine.stale():
+            engine = _engines[directory] = ScanEngine(directory, previous=engine)
+        return engine
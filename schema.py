@@ -0,0 +1,105 @@
+"""Typed in-memory schema for the SKF violations dataset.
+
+Dimension columns are low-cardinality strings repeated on every row. They
+are normalized (surrounding and doubled whitespace removed) and stored as
+pandas categoricals, so ``isin``, ``groupby``, ``value_counts`` and
+``pivot_table`` operate on small integer codes instead of Python strings.
+
+Code dictionaries are stable: calendar dimensions use their natural order
+and every other dimension uses its sorted values, so the same data always
+yields the same codes regardless of row order.
+"""
+
+import numpy as np
+import pandas as pd
+
+MONTH_ORDER = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December"
+]
+DAY_ORDER = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Dimension -> fixed category order (None: sorted observed values).
+DIMENSIONS = {
+    "Country": None,
+    "Violation_Nature": None,
+    "Attackers": None,
+    "Victim_Occupation": None,
+    "Gender": None,
+    "Day": DAY_ORDER,
+    "Month": MONTH_ORDER,
+}
+
+
+def normalize_labels(series):
+    """Strip and collapse whitespace in a string column, keeping missing values."""
+    cleaned = series.astype("string").str.strip().str.replace(r"\s+", " ", regex=True)
+    cleaned = cleaned.mask(cleaned == "")
+    return cleaned.astype(object).where(cleaned.notna(), None)
+
+
+def categories_for(labels, order=None):
+    """Stable code dictionary for a collection of normalized labels."""
+    values = {label for label in labels if label is not None}
+    if order is None:
+        return sorted(values)
+    # Keep the natural order, appending anything unexpected at the end.
+    return list(order) + sorted(values - set(order))
+
+
+def encode_dimension(series, order=None):
+    """Normalize ``series`` and return it as a stably coded categorical.
+
+    Normalization runs on the distinct labels only; rows are then recoded
+    with a single integer lookup, so the cost does not grow with string
+    length times row count.
+    """
+    raw = pd.Categorical(series)
+    labels = normalize_labels(pd.Series(raw.categories, dtype=object)).tolist()
+    dtype = pd.CategoricalDtype(categories_for(labels, order), ordered=order is not None)
+    lookup = np.array(
+        [dtype.categories.get_loc(label) if label is not None else -1 for label in labels],
+        dtype=np.int32,
+    )
+    codes = np.where(raw.codes >= 0, lookup[raw.codes] if len(lookup) else -1, -1)
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), index=series.index, name=series.name)
+
+
+def apply_schema(data):
+    """Normalize and dictionary-encode the dimension columns of ``data``."""
+    for col, order in DIMENSIONS.items():
+        if col in data.columns:
+            data[col] = encode_dimension(data[col], order)
+    if "Violation_ID" in data.columns and data["Violation_ID"].notna().all():
+        data["Violation_ID"] = pd.to_numeric(data["Violation_ID"], downcast="integer")
+    return data
+
+
+def concat_frames(frames):
+    """``pd.concat`` of frames whose categoricals may have different categories.
+
+    Categories are unified first, in the stable order ``encode_dimension``
+    uses, so the result stays categorical instead of falling back to strings.
+    Only integer codes are remapped.
+    """
+    frames = list(frames)
+    unified = {}
+    for col in frames[0].columns:
+        dtypes = [f[col].dtype for f in frames]
+        if not all(isinstance(d, pd.CategoricalDtype) for d in dtypes) or len(set(dtypes)) == 1:
+            continue
+        labels = set().union(*(d.categories for d in dtypes))
+        dtype = pd.CategoricalDtype(categories_for(labels, DIMENSIONS.get(col)), ordered=dtypes[0].ordered)
+        codes = []
+        for f, d in zip(frames, dtypes):
+            # Trailing -1 so that missing values (code -1) stay missing.
+            lookup = np.append(dtype.categories.get_indexer(d.categories), -1)
+            codes.append(lookup[f[col].cat.codes.to_numpy()])
+        unified[col] = pd.Categorical.from_codes(np.concatenate(codes), dtype=dtype)
+    out = pd.concat([f.drop(columns=list(unified)) for f in frames], ignore_index=True)
+    return out.assign(**unified)[list(frames[0].columns)]
+
+
+def memory_footprint(data):
+    """Deep memory usage of ``data`` in bytes."""
+    return int(data.memory_usage(deep=True).sum())
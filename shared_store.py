@@ -0,0 +1,187 @@
+"""The loaded dataset and its indexes, published once for every server process.
+
+Each Streamlit server process normally loads the snapshot, splits off the
+country dimension and builds the filter index and cube on its own, so the
+memory of the dataset grows with the number of workers on a host. With
+``SKF_SHARED=1`` the first process to load a dataset version publishes all
+of it as a generation under ``snapshots/shared/`` (``SKF_SHARED_DIR``):
+
+* ``facts.arrow``: the fact columns as one uncompressed Arrow record
+  batch, with missing floats stored as NaN, so that every column maps
+  without a copy;
+* ``structures.pkl`` and ``*.npy``: the dimension table, filter index and
+  cube, pickled with their numpy arrays written out as ``.npy`` files.
+
+Every process, the publisher included, then attaches to the generation
+read-only: the Arrow file and the arrays are memory-mapped, so their pages
+live once in the page cache and are shared by all workers instead of being
+copied into each one.
+
+Generations are named after the dataset's content hash (and the distinct
+count mode the cube was built with), written to a temporary directory and
+renamed into place. A reload that finds a new hash attaches to, or
+publishes, a new generation; processes still serving the previous one keep
+their mappings until their own next reload. Only the ``KEEP`` newest
+generations are kept on disk. Publishing holds a lock file, so concurrent
+workers wait for one build instead of repeating it.
+"""
+
+import fcntl
+import glob
+import os
+import pickle
+import shutil
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import distinct_counts
+import ingest
+from cube import Cube
+from filter_index import FilterIndex
+from instrumentation import span
+
+SHARED_DIR = os.environ.get("SKF_SHARED_DIR") or os.path.join(ingest.SNAPSHOT_DIR, "shared")
+FORMAT = "1"
+KEEP = 2
+# Arrays smaller than this stay inside the pickle
+MIN_MAPPED_BYTES = 1 << 16
+# Structures built from the fact frame and published with it, by derived() name
+STRUCTURES = {"filter_index": FilterIndex, "cube": Cube}
+
+
+def enabled():
+    return os.environ.get("SKF_SHARED", "0") == "1"
+
+
+def generation_name(path, digest):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}-{digest[:16]}-{distinct_counts.default_mode()}-v{FORMAT}"
+
+
+@contextmanager
+def _publish_lock(directory):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _arrow_table(frame):
+    """``frame`` as Arrow with float NaN kept as values, not nulls."""
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    for i, col in enumerate(frame.columns):
+        if frame[col].dtype.kind == "f":
+            table = table.set_column(i, col, pa.array(frame[col].to_numpy(), from_pandas=False))
+    return table
+
+
+class _ArrayPickler(pickle.Pickler):
+    """Writes large numeric arrays to ``.npy`` files instead of the pickle."""
+
+    def __init__(self, file, directory):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.directory = directory
+        self.files = 0
+
+    def persistent_id(self, obj):
+        if type(obj) is np.ndarray and obj.dtype.kind in "biuf" and obj.nbytes >= MIN_MAPPED_BYTES:
+            name = f"{self.files}.npy"
+            self.files += 1
+            np.save(os.path.join(self.directory, name), np.ascontiguousarray(obj))
+            return name
+        return None
+
+
+class _ArrayUnpickler(pickle.Unpickler):
+    def __init__(self, file, directory):
+        super().__init__(file)
+        self.directory = directory
+
+    def persistent_load(self, name):
+        # Read-only mapping, as a plain ndarray view of it
+        return np.asarray(np.load(os.path.join(self.directory, name), mmap_mode="r"))
+
+
+def _write(directory, frame, dimension, coerced_dates):
+    # One record batch: chunked columns would be concatenated (copied) by to_pandas
+    table = _arrow_table(frame).combine_chunks()
+    feather.write_feather(table, os.path.join(directory, "facts.arrow"),
+                          compression="uncompressed", chunksize=max(table.num_rows, 1))
+    structures = {name: build(frame) for name, build in STRUCTURES.items()}
+    with open(os.path.join(directory, "structures.pkl"), "wb") as f:
+        _ArrayPickler(f, directory).dump({
+            "dimension": dimension, "structures": structures, "coerced_dates": coerced_dates,
+        })
+
+
+class Generation:
+    """One published version of a dataset, attached read-only."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.name = os.path.basename(directory)
+        with pa.memory_map(os.path.join(directory, "facts.arrow")) as source:
+            table = pa.ipc.open_file(source).read_all()
+        self.frame = table.to_pandas(split_blocks=True)
+        with open(os.path.join(directory, "structures.pkl"), "rb") as f:
+            published = _ArrayUnpickler(f, directory).load()
+        self.dimension = published["dimension"]
+        self.structures = published["structures"]
+        self.coerced_dates = published["coerced_dates"]
+
+
+def _prune(root, stem):
+    """Remove all but the ``KEEP`` newest generations of ``stem``.
+
+    Processes still attached to a removed generation keep their mappings.
+    """
+    generations = sorted(glob.glob(os.path.join(root, f"{stem}-*-v*")), key=os.path.getmtime)
+    for directory in generations[:-KEEP]:
+        if not directory.endswith(".tmp"):
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def attach(path, digest, load, root=None):
+    """The generation of ``path`` at ``digest``, published first if missing.
+
+    ``load()`` returns the ``(facts, dimension)`` to publish; it is only
+    called by the process that publishes.
+    """
+    root = root or SHARED_DIR
+    directory = os.path.join(root, generation_name(path, digest))
+    if not os.path.isdir(directory):
+        with _publish_lock(root):
+            if not os.path.isdir(directory):
+                with span("publish shared", generation=os.path.basename(directory)) as record:
+                    start = time.perf_counter()
+                    frame, dimension = load()
+                    tmp = directory + ".tmp"
+                    shutil.rmtree(tmp, ignore_errors=True)
+                    os.makedirs(tmp)
+                    _write(tmp, frame, dimension, frame.attrs.get("coerced_dates", 0))
+                    os.rename(tmp, directory)
+                    _prune(root, os.path.splitext(os.path.basename(path))[0])
+                    record["seconds"] = round(time.perf_counter() - start, 3)
+    with span("attach shared", generation=os.path.basename(directory)):
+        return Generation(directory)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import data_loader
+
+    parser = argparse.ArgumentParser(description="Publish the current dataset for the server processes.")
+    parser.parse_args()
+    os.environ["SKF_SHARED"] = "1"
+    frame = data_loader.load_data()
+    directory = os.path.join(SHARED_DIR, data_loader.cache_stats()["shared_generation"])
+    size = sum(os.path.getsize(f) for f in glob.glob(os.path.join(directory, "*")))
+    print(f"{directory}: {len(frame):,} rows, {size / 1e6:,.1f} MB mapped by every worker")
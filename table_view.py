@@ -0,0 +1,61 @@
+"""Server-side paging, sorting and column projection for the Raw Data view.
+
+Only the rows of the visible page are ever copied out of the shared frame
+and sent to the browser. A filter selection is carried around as sorted
+row ids (``None`` meaning every row), as produced by the filter index.
+Per-country attributes live in the country dimension and are joined in for
+the visible page only.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from figure_cache import FigureCache
+
+PAGE_SIZES = [25, 50, 100, 250, 500]
+# Row orders are 8 bytes per selected row, so they are cached apart from the
+# figures and bounded by their total size.
+MAX_ORDER_BYTES = 256 * 2**20
+order_cache = FigureCache(max_bytes=MAX_ORDER_BYTES, size=lambda rows: 0 if rows is None else rows.nbytes)
+
+
+def page_count(n_rows, page_size):
+    return max(1, math.ceil(n_rows / page_size))
+
+
+def sorted_rows(data, rows, sort_by=None, ascending=True, dimension=None):
+    """Row ids of the selection in display order.
+
+    Without a sort column the selection keeps file order and ``rows`` is
+    returned unchanged. Missing values always sort last; categoricals sort
+    in category order (calendar order for Month and Day).
+    """
+    if sort_by is None:
+        return rows
+    if dimension is not None and sort_by in dimension.columns:
+        column = pd.Series(dimension.column(sort_by, rows))
+    else:
+        column = data[sort_by] if rows is None else data[sort_by].take(rows)
+    order = (
+        column.reset_index(drop=True)
+        .sort_values(ascending=ascending, kind="stable", na_position="last")
+        .index.to_numpy()
+    )
+    return order if rows is None else rows[order]
+
+
+def page_window(data, rows, page, page_size, columns=None, dimension=None):
+    """The ``page``-th (1-based) window of the selection, projected to ``columns``."""
+    start = (page - 1) * page_size
+    if rows is None:
+        ids = np.arange(start, min(start + page_size, len(data)))
+    else:
+        ids = rows[start:start + page_size]
+    if dimension is not None:
+        facts = [c for c in columns or data.columns if c in data.columns]
+        part = data.iloc[ids, [data.columns.get_loc(c) for c in facts]]
+        return dimension.join(part, ids, columns or None)
+    col_ids = slice(None) if not columns else [data.columns.get_loc(c) for c in columns]
+    return data.iloc[ids, col_ids]
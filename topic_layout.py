@@ -0,0 +1,113 @@
+"""Collision-aware layout for the topic word cloud.
+
+Words are placed largest first along an Archimedean spiral on a coarse
+occupancy grid. Every candidate position along the spiral is tested at
+once against a summed-area table of the grid, so placing a word costs a
+few array operations regardless of how many words are already placed.
+
+Font sizes are scaled down uniformly when the words could not fit on the
+canvas at their nominal size, so the cloud stays readable without overlaps.
+"""
+
+import numpy as np
+
+# Approximate plotting area of the lexicon chart in pixels (wide layout,
+# 600px tall figure minus margins).
+CANVAS_WIDTH = 1200
+CANVAS_HEIGHT = 560
+CELL = 4            # occupancy grid resolution in pixels
+CHAR_WIDTH = 0.6    # average glyph width in ems
+LINE_HEIGHT = 1.15  # text box height in ems
+PADDING = 4         # pixels kept free around each word
+MAX_FILL = 0.6      # share of the canvas the text boxes may cover
+
+
+def text_boxes(words, sizes):
+    """Estimated pixel width and height of each word at its font size."""
+    lengths = np.array([len(str(w)) for w in words], dtype=float)
+    widths = sizes * CHAR_WIDTH * np.maximum(lengths, 1) + PADDING
+    heights = sizes * LINE_HEIGHT + PADDING
+    return widths, heights
+
+
+def fit_scale(widths, heights, width=CANVAS_WIDTH, height=CANVAS_HEIGHT, fill=MAX_FILL):
+    """Uniform font scale (<= 1) that lets the boxes cover at most ``fill``."""
+    area = float(np.sum(widths * heights))
+    if area == 0:
+        return 1.0
+    return min(1.0, float(np.sqrt(fill * width * height / area)))
+
+
+def _spiral_offsets(grid_w, grid_h, spacing=1.5, step=0.2):
+    """Cell offsets along an Archimedean spiral, stretched to the canvas aspect.
+
+    The spiral moves ``spacing`` cells outwards per turn and extends until it
+    covers the whole grid from any starting point near the centre.
+    """
+    aspect = grid_w / max(grid_h, 1)
+    max_radius = grid_h  # vertical radius; the horizontal one is stretched
+    t = np.arange(0, 2 * np.pi * max_radius / spacing, step)
+    r = spacing * t / (2 * np.pi)
+    dx = np.rint(r * np.cos(t) * aspect).astype(np.int64)
+    dy = np.rint(r * np.sin(t)).astype(np.int64)
+    offsets = np.stack([dx, dy], axis=1)
+    # Drop consecutive duplicates while keeping spiral order.
+    keep = np.ones(len(offsets), dtype=bool)
+    keep[1:] = np.any(offsets[1:] != offsets[:-1], axis=1)
+    return offsets[keep]
+
+
+def spiral_layout(words, sizes, seed=42, width=CANVAS_WIDTH, height=CANVAS_HEIGHT):
+    """Place ``words`` without overlaps.
+
+    Returns ``(x, y, sizes)``: word centres in axis units (0..1, y up) and
+    the font sizes actually used, all aligned with the input order.
+    """
+    sizes = np.asarray(sizes, dtype=float)
+    n = len(sizes)
+    if n == 0:
+        return np.empty(0), np.empty(0), sizes
+
+    widths, heights = text_boxes(words, sizes)
+    scale = fit_scale(widths, heights, width, height)
+    sizes = sizes * scale
+    widths, heights = text_boxes(words, sizes)
+
+    grid_w, grid_h = int(np.ceil(width / CELL)), int(np.ceil(height / CELL))
+    box_w = np.clip(np.ceil(widths / CELL).astype(np.int64), 1, grid_w)
+    box_h = np.clip(np.ceil(heights / CELL).astype(np.int64), 1, grid_h)
+
+    occupied = np.zeros((grid_h, grid_w), dtype=np.int32)
+    offsets = _spiral_offsets(grid_w, grid_h)
+    rng = np.random.default_rng(seed)
+    x = np.empty(n)
+    y = np.empty(n)
+
+    for i in np.argsort(-sizes, kind="stable"):
+        bw, bh = box_w[i], box_h[i]
+        # Start near the centre with a little jitter so the cloud is not rigid.
+        cx = grid_w // 2 + rng.integers(-grid_w // 10, grid_w // 10 + 1)
+        cy = grid_h // 2 + rng.integers(-grid_h // 10, grid_h // 10 + 1)
+        left = cx + offsets[:, 0] - bw // 2
+        top = cy + offsets[:, 1] - bh // 2
+        inside = (left >= 0) & (top >= 0) & (left + bw <= grid_w) & (top + bh <= grid_h)
+        left, top = left[inside], top[inside]
+        if len(left) == 0:
+            left = np.array([max(0, (grid_w - bw) // 2)])
+            top = np.array([max(0, (grid_h - bh) // 2)])
+
+        table = np.zeros((grid_h + 1, grid_w + 1), dtype=np.int64)
+        table[1:, 1:] = occupied.cumsum(0).cumsum(1)
+        overlap = (
+            table[top + bh, left + bw] - table[top, left + bw]
+            - table[top + bh, left] + table[top, left]
+        )
+        free = np.flatnonzero(overlap == 0)
+        # Overcrowded canvas: fall back to the least overlapping position.
+        k = free[0] if len(free) else int(np.argmin(overlap))
+        l, t = left[k], top[k]
+        occupied[t:t + bh, l:l + bw] = 1
+        x[i] = (l + bw / 2) * CELL / width
+        y[i] = 1 - (t + bh / 2) * CELL / height
+
+    return x, y, sizes
@@ -0,0 +1,188 @@
+"""Parallel warm-up of every section's default view.
+
+Each chart section renders from several independent roll-ups and pivots,
+which a rerun computes one after another on its script thread. The warm-up
+computes the unfiltered view of every section, and the structures they
+need (filter index, cube), ahead of time on a thread pool and stores the
+results in ``figure_cache`` under the keys ``dashboard.py`` looks up, so
+the first visit to any section is a cache hit. The figures' compact
+payloads (``figure_payload``) are computed with them.
+
+Workers are threads rather than processes: they read the same memory-mapped
+Arrow columns and the same cube without copying or pickling them, and the
+heavy parts (factorize, groupby, sorts, bitmap operations) run in numpy,
+pandas and Arrow kernels that release the GIL. Building the Plotly figures
+themselves does not, so that part only overlaps with the aggregation.
+
+A stage is submitted as soon as the stages it depends on are done, and its
+wall time is recorded. ``report()`` returns the last run (the debug panel
+shows it) and ``python warmup.py`` prints one.
+
+``app.py`` runs the warm-up before the server accepts connections; under
+``streamlit run dashboard.py`` the first rerun of each dataset version
+starts it in the background. ``SKF_WARMUP=0`` turns it off and
+``SKF_WARMUP_WORKERS`` sets the pool size.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import backend
+import charts
+import figure_payload
+from data_loader import TOPICS_PATH, dataset_version, derived
+from figure_cache import canonical_filters, figure_cache
+from filter_index import FILTER_COLUMNS
+
+logger = logging.getLogger("skf.warmup")
+
+_lock = threading.Lock()
+_started = None  # dataset version of the last warm-up started
+_report = {}
+
+
+def enabled():
+    return os.environ.get("SKF_WARMUP", "1") != "0"
+
+
+def default_workers():
+    return int(os.environ.get("SKF_WARMUP_WORKERS", 0)) or min(8, os.cpu_count() or 1)
+
+
+def plan(source):
+    """Stages warming ``source``: ``{name: (dependencies, function)}``.
+
+    View stages store what ``dashboard.py`` caches for the section with no
+    sidebar filter and default widget values (all Trends options).
+    """
+    stages = {}
+
+    def view(section, *key, build, after=("cube",)):
+        # Same key as dashboard.cached(): (section, filter_state) + widget values
+        def run():
+            state = canonical_filters(source.filter_index)
+            where = dict(zip(FILTER_COLUMNS, state))
+            figure_cache.get(source.version, (section, state) + key, lambda: figure_payload.prepare(build(where)))
+        stages[" / ".join((section,) + key)] = (after, run)
+
+    stages["cube"] = ((), source.cube)
+    view("Overview", build=lambda where: charts.overview_figures(source.cube(), where))
+    for metric in charts.TREND_METRICS:
+        for unit in charts.TREND_UNITS:
+            view("Trends", metric, unit,
+                 build=lambda where, metric=metric, unit=unit: charts.trends_figure(source.cube(), where, metric, unit))
+    view("Violation Patterns", build=lambda where: charts.violation_pattern_figures(source.cube(), where))
+    view("Cross Analysis", build=lambda where: charts.cross_analysis_figures(source.cube(), where))
+    view("Governance", after=(),
+         build=lambda where: charts.governance_figures(source.governance_stats(), where))
+
+    def topics():
+        words = derived("topic_words", charts.prepare_topic_words, path=TOPICS_PATH)
+        figure_cache.get(source.version, ("Topics & Themes", dataset_version(TOPICS_PATH), "All"),
+                         lambda: figure_payload.prepare(charts.topic_words_figure(words, "All")))
+    stages["Topics & Themes / All"] = ((), topics)
+    return stages
+
+
+def run(source=None, workers=None):
+    """Warm every default view of ``source`` (the current store) and return the report."""
+    global _started
+    start = time.perf_counter()
+    source = source or backend.current()
+    opened_ms = (time.perf_counter() - start) * 1000
+    with _lock:
+        _started = source.version
+    stages = plan(source)
+    workers = workers or default_workers()
+
+    timings = {}
+    remaining = dict(stages)
+    finished = threading.Event()
+    state_lock = threading.Lock()
+
+    def execute(name):
+        begin = time.perf_counter()
+        error = None
+        try:
+            stages[name][1]()
+        except Exception as exc:  # reported; the section builds it on demand
+            error = repr(exc)
+            logger.exception("warm-up stage %s failed", name)
+        end = time.perf_counter()
+        with state_lock:
+            timings[name] = {
+                "start_ms": round((begin - start) * 1000, 1),
+                "ms": round((end - begin) * 1000, 1),
+                "thread": threading.current_thread().name,
+                "error": error,
+            }
+            ready = [n for n, (after, _) in remaining.items() if all(d in timings for d in after)]
+            for n in ready:
+                del remaining[n]
+            done = len(timings) == len(stages)
+        for n in ready:
+            pool.submit(execute, n)
+        if done:
+            finished.set()
+
+    with ThreadPoolExecutor(workers, thread_name_prefix="warmup") as pool:
+        with state_lock:
+            ready = [n for n, (after, _) in remaining.items() if not after]
+            for n in ready:
+                del remaining[n]
+        for n in ready:
+            pool.submit(execute, n)
+        finished.wait()
+
+    wall_ms = (time.perf_counter() - start) * 1000
+    report = {
+        "version": source.version,
+        "workers": workers,
+        "open_ms": round(opened_ms, 1),
+        "wall_ms": round(wall_ms, 1),
+        # Sum of the stage times: what the same work takes one stage at a time
+        "serial_ms": round(opened_ms + sum(t["ms"] for t in timings.values()), 1),
+        "stages": {name: timings[name] for name in stages},
+    }
+    with _lock:
+        _report.clear()
+        _report.update(report)
+    logger.info("warm-up of %s: %.0f ms wall, %.0f ms of stages on %d workers",
+                source.version, report["wall_ms"], report["serial_ms"], workers)
+    return report
+
+
+def start(source=None):
+    """Warm ``source`` in a background thread, once per dataset version."""
+    global _started
+    if not enabled():
+        return
+    source = source or backend.current()
+    with _lock:
+        if source.version == _started:
+            return
+        _started = source.version
+    threading.Thread(target=run, args=(source,), name="warmup", daemon=True).start()
+
+
+def report():
+    """Stage timings of the last completed warm-up (empty before the first)."""
+    with _lock:
+        return dict(_report)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Time a warm-up of the dashboard's default views.")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    result = run(workers=args.workers)
+    print(f"{'open store':<32} {0:>9.1f} {result['open_ms']:>9.1f} ms")
+    for name, timing in sorted(result["stages"].items(), key=lambda kv: kv[1]["start_ms"]):
+        status = f"  {timing['error']}" if timing["error"] else ""
+        print(f"{name:<32} {timing['start_ms']:>9.1f} {timing['ms']:>9.1f} ms{status}")
+    print(f"wall {result['wall_ms']:.1f} ms, stages {result['serial_ms']:.1f} ms, {result['workers']} workers")